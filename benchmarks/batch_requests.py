@@ -0,0 +1,55 @@
+"""Many small requests one by one against get_results
+
+Mock server waits latency seconds before each reply, as a remote server
+computing a result would. Prints seconds of sequential get_result calls
+and of get_results with several parallel requests.
+usage: batch_requests.py [requests] [points] [latency ms]
+"""
+import sys
+import time
+
+import lisptick
+import lisptick_mock
+
+REQUESTS = 200
+POINTS = 1000
+LATENCY = 0.01
+PARALLEL = [1, 4, 8, 16]
+
+
+def delayed(data, latency):
+    """Response function sending data after latency seconds"""
+    def response(_):
+        time.sleep(latency)
+        yield data
+    return response
+
+
+def main():
+    """Print seconds and requests/s of each way"""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else REQUESTS
+    points = int(sys.argv[2]) if len(sys.argv) > 2 else POINTS
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else LATENCY
+    data = lisptick_mock.timeserie_stream(points)
+    requests = [str(i) for i in range(count)]
+    responses = {request: delayed(data, latency) for request in requests}
+    print("requests: %d, points: %d, latency: %.0f ms" % (count, points, latency * 1000))
+    with lisptick_mock.MockServer(responses) as server:
+        conn = server.client()
+        start = time.perf_counter()
+        for request in requests:
+            conn.get_result(request)
+        elapsed = time.perf_counter() - start
+        print("%-16s %7.3f s %8.0f requests/s" % ("get_result", elapsed, count / elapsed))
+        for parallel in PARALLEL:
+            start = time.perf_counter()
+            results = conn.get_results(requests, max_parallel=parallel)
+            elapsed = time.perf_counter() - start
+            if any(len(result) != points for result in results):
+                raise RuntimeError("wrong result size")
+            print("%-16s %7.3f s %8.0f requests/s" % (
+                "get_results %d" % parallel, elapsed, count / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Per element decoding cost of LisptickReader for each type
+
+Elements are decoded from memory one by one with read_element, so that
+only type dispatch and payload decoding are measured.
+Large tensors are decoded as Tensor and as numpy array.
+usage: element_decoding.py [elements] [tensor side]
+"""
+import datetime
+import sys
+import time
+
+import lisptick
+import lisptick_mock
+
+ELEMENTS = 200000
+TENSOR_SIDE = 1000
+
+DAY = datetime.datetime(2017, 10, 26)
+
+# (name, value) decoded as single elements
+VALUES = [
+    ("int", 7),
+    ("float", 3.14),
+    ("bool", True),
+    ("dec64", lisptick_mock.Dec64(25, -7)),
+    ("time", DAY),
+    ("duration", lisptick.Duration(1, 1, 10, 10000000000)),
+    ("string", "LispTick v1.0.0"),
+    ("array", [1, 2, 3, 4]),
+    ("pair", (3.5, "toto")),
+    ("heartbeat", lisptick.HeartBeat(1)),
+    ("tensor", lisptick.Tensor([3, 3], [float(i) for i in range(1, 10)])),
+]
+
+# (name, type) decoded as timeserie points
+POINTS = [
+    ("int point", lisptick.TINT),
+    ("float point", lisptick.TFLOAT),
+    ("bool point", lisptick.TBOOL),
+    ("dec64 point", lisptick.TDEC64),
+]
+
+
+def value_stream(value, elements):
+    """Stream of elements times value"""
+    element = lisptick_mock.encode_element(value)
+    return element * elements + lisptick_mock.StreamWriter().end().getvalue()
+
+
+def bench(data, elements):
+    """Decode data element by element, return seconds"""
+    reader = lisptick.LisptickReader(data)
+    # no bulk decoding, measure element path
+    reader.bulk = None
+    count = 0
+    start = time.perf_counter()
+    while reader.read_element() is not None:
+        count += 1
+    elapsed = time.perf_counter() - start
+    if count != elements:
+        raise RuntimeError("decoded %d elements instead of %d" % (count, elements))
+    return elapsed
+
+
+def bench_tensor(data, tensor_array):
+    """Decode a tensor result, return seconds"""
+    reader = lisptick.LisptickReader(data)
+    reader.tensor_array = tensor_array
+    start = time.perf_counter()
+    reader.get_result()
+    return time.perf_counter() - start
+
+
+def main():
+    """Print ns per element of each type, then ns per tensor value"""
+    elements = int(sys.argv[1]) if len(sys.argv) > 1 else ELEMENTS
+    side = int(sys.argv[2]) if len(sys.argv) > 2 else TENSOR_SIDE
+    print("elements: %d" % elements)
+    cases = [(name, value_stream(value, elements)) for name, value in VALUES]
+    cases += [(name, lisptick_mock.timeserie_stream(elements, value_type))
+              for name, value_type in POINTS]
+    for name, data in cases:
+        elapsed = bench(data, elements)
+        print("%-12s %8.0f ns/element" % (name, elapsed / elements * 1e9))
+    values = side * side
+    print("tensor: %dx%d" % (side, side))
+    data = value_stream(lisptick.Tensor([side, side], [float(i) for i in range(values)]), 1)
+    for name, tensor_array in [("Tensor", False), ("numpy", True)]:
+        elapsed = bench_tensor(data, tensor_array)
+        print("%-12s %8.1f ns/value" % (name, elapsed / values * 1e9))
+
+
+if __name__ == "__main__":
+    main()
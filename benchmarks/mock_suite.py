@@ -0,0 +1,103 @@
+"""get_result, walk_result, get_columns and spill benchmarks against a local mock server
+
+Each case runs in its own process so that peak RSS is measured per case.
+usage: mock_suite.py [max points]
+"""
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import lisptick
+import lisptick_mock
+
+SIZES = [1000, 10000, 100000, 1000000, 10000000]
+MAX_POINTS = 1000000
+MODES = ["get_result", "walk_result", "get_columns", "spill"]
+
+
+def run_client(host, port, mode, points):
+    """Decode one request, print seconds, first point latency and peak RSS"""
+    conn = lisptick.Socket(host, int(port))
+    first = [None]
+    count = [0]
+
+    def on_value(_, __, value):
+        if isinstance(value, lisptick.Point):
+            if first[0] is None:
+                first[0] = time.perf_counter() - start
+            count[0] += 1
+
+    start = time.perf_counter()
+    if mode == "walk_result":
+        conn.walk_result(points, on_value)
+    elif mode == "get_columns":
+        count[0] = len(conn.get_columns(points)[0])
+    elif mode == "spill":
+        with tempfile.TemporaryDirectory() as directory:
+            count[0] = len(conn.spill(points, directory))
+    else:
+        count[0] = len(conn.get_result(points))
+    elapsed = time.perf_counter() - start
+    if first[0] is None:
+        # whole result is available at once
+        first[0] = elapsed
+    print(json.dumps({
+        "points": count[0],
+        "seconds": elapsed,
+        "first": first[0],
+        "rss": peak_rss()}))
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes"""
+    try:
+        # ru_maxrss keeps parent peak across fork and exec on Linux
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # kilo bytes on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main():
+    """Print one line per size and mode"""
+    max_points = int(float(sys.argv[1])) if len(sys.argv) > 1 else MAX_POINTS
+    sizes = [size for size in SIZES if size <= max_points]
+    streams = {}
+
+    def response(code):
+        if code not in streams:
+            streams[code] = lisptick_mock.timeserie_stream(int(code), heartbeat=1000)
+        return streams[code]
+
+    modes = MODES if lisptick.numpy is not None else MODES[:2]
+    with lisptick_mock.MockServer({str(size): response for size in sizes}) as server:
+        print("%-12s %9s %12s %10s %10s %10s" % (
+            "mode", "points", "points/s", "MB/s", "first ms", "RSS MB"))
+        for size in sizes:
+            for mode in modes:
+                out = subprocess.run(
+                    [sys.executable, __file__, "--client", server.host,
+                     str(server.port), mode, str(size)],
+                    check=True, stdout=subprocess.PIPE).stdout
+                res = json.loads(out.decode())
+                if res["points"] != size:
+                    raise RuntimeError("%s decoded %d points instead of %d" % (
+                        mode, res["points"], size))
+                print("%-12s %9d %12.0f %10.1f %10.2f %10.1f" % (
+                    mode, size, size / res["seconds"],
+                    len(streams[str(size)]) / res["seconds"] / 1e6,
+                    res["first"] * 1000, res["rss"] / 1e6))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--client":
+        run_client(*sys.argv[2:])
+    else:
+        main()
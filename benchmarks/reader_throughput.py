@@ -0,0 +1,107 @@
+"""Decode throughput of LisptickReader on a synthetic float timeserie
+
+Stream is sent through a local socket pair so that recv calls are real
+syscalls, run it before and after a reader change to compare.
+With stats, reader is instrumented and its ReaderStats printed.
+usage: reader_throughput.py [points] [walk|columns] [stats]
+"""
+import socket
+import sys
+import threading
+import time
+
+import lisptick
+import lisptick_mock
+
+POINTS = 1000000
+
+
+class CountingSocket():
+    """Socket proxy counting recv calls and received bytes"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.calls = 0
+        self.received = 0
+
+    def recv(self, size):
+        """Counted socket recv"""
+        res = self.sock.recv(size)
+        self.calls += 1
+        self.received += len(res)
+        return res
+
+    def recv_into(self, buffer):
+        """Counted socket recv_into"""
+        res = self.sock.recv_into(buffer)
+        self.calls += 1
+        self.received += res
+        return res
+
+    def close(self):
+        """Close proxied socket"""
+        self.sock.close()
+
+
+def send_all(sock, data):
+    """Send data then close sending side"""
+    sock.sendall(data)
+    sock.shutdown(socket.SHUT_WR)
+
+
+def decode_walk(reader):
+    """Decode with walk_result, return number of points"""
+    count = [0]
+
+    def on_value(_, __, ___):
+        count[0] += 1
+
+    reader.walk_result(on_value)
+    return count[0]
+
+
+def decode_columns(reader):
+    """Decode with get_columns, return number of points"""
+    return len(reader.get_columns()[0])
+
+
+def bench(data, points, decode, instrument=False):
+    """Decode data received from a socket pair, return seconds, recv calls and stats"""
+    reader_side, writer_side = socket.socketpair()
+    sender = threading.Thread(target=send_all, args=(writer_side, data))
+    sender.start()
+    con = CountingSocket(reader_side)
+    reader = lisptick.LisptickReader(con)
+    stats = reader.instrument() if instrument else None
+    start = time.perf_counter()
+    count = decode(reader)
+    elapsed = time.perf_counter() - start
+    sender.join()
+    con.close()
+    writer_side.close()
+    if count != points:
+        raise RuntimeError("decoded %d points instead of %d" % (count, points))
+    return elapsed, con.calls, stats
+
+
+def main():
+    """Print points/s, MB/s and recv calls"""
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else POINTS
+    mode = sys.argv[2] if len(sys.argv) > 2 else "walk"
+    decode = decode_columns if mode == "columns" else decode_walk
+    instrument = len(sys.argv) > 3 and sys.argv[3] == "stats"
+    data = lisptick_mock.timeserie_stream(points)
+    elapsed, calls, stats = bench(data, points, decode, instrument)
+    print("mode:     %s" % mode)
+    print("points:   %d" % points)
+    print("bytes:    %d" % len(data))
+    print("seconds:  %.3f" % elapsed)
+    print("points/s: %.0f" % (points / elapsed))
+    print("MB/s:     %.1f" % (len(data) / elapsed / 1e6))
+    print("recv:     %d calls" % calls)
+    if stats is not None:
+        print(stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Socket draining with a slow consumer, Stream against Pipeline
+
+Server sends a synthetic float timeserie through a local socket pair,
+consumer sleeps every sleep_every points. Prints when the server could
+send its last byte and when the consumer got its last point.
+usage: slow_consumer.py [points] [sleep_every]
+"""
+import socket
+import sys
+import threading
+import time
+
+import lisptick
+import lisptick_mock
+
+POINTS = 200000
+SLEEP_EVERY = 1000
+SLEEP = 0.001
+
+
+def send_all(sock, data, sent):
+    """Send data, record when it is fully sent"""
+    sock.sendall(data)
+    sent.append(time.perf_counter())
+
+
+def bench(data, make):
+    """Consume a result slowly, return seconds to send and to consume"""
+    reader_side, writer_side = socket.socketpair()
+    sent = []
+    sender = threading.Thread(target=send_all, args=(writer_side, data, sent))
+    start = time.perf_counter()
+    sender.start()
+    count = 0
+    with make(reader_side) as result:
+        for _ in result:
+            count += 1
+            if count % SLEEP_EVERY == 0:
+                time.sleep(SLEEP)
+    consumed = time.perf_counter()
+    sender.join()
+    writer_side.close()
+    return sent[0] - start, consumed - start, result
+
+
+def main():
+    """Print send and consume seconds of Stream and Pipeline"""
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else POINTS
+    global SLEEP_EVERY
+    SLEEP_EVERY = int(sys.argv[2]) if len(sys.argv) > 2 else SLEEP_EVERY
+    data = lisptick_mock.timeserie_stream(points)
+    print("points: %d, bytes: %d" % (points, len(data)))
+    for name, make in [("stream", lisptick.Stream), ("pipeline", lisptick.Pipeline)]:
+        sent, consumed, result = bench(data, make)
+        print("%-8s sent %6.3f s, consumed %6.3f s" % (name, sent, consumed))
+        if name == "pipeline":
+            print(result.get_stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Time decoding cost of LisptickReader for each time mode
+
+Stream is decoded from memory so that only decoding is measured.
+usage: time_decoding.py [points] [points per repeated timestamp]
+"""
+import sys
+import time
+
+import lisptick
+import lisptick_mock
+
+POINTS = 1000000
+
+MODES = [
+    ("local", lisptick.TIME_LOCAL, 0),
+    ("utc", lisptick.TIME_UTC, 0),
+    ("nano", lisptick.TIME_NANO, 0),
+    ("local cached", lisptick.TIME_LOCAL, 4096),
+]
+
+
+def bench(data, points, decoder):
+    """Decode data with walk_result, return seconds"""
+    count = [0]
+
+    def on_value(_, __, ___):
+        count[0] += 1
+
+    start = time.perf_counter()
+    lisptick.LisptickReader(data, time_decoder=decoder).walk_result(on_value)
+    elapsed = time.perf_counter() - start
+    if count[0] != points:
+        raise RuntimeError("decoded %d points instead of %d" % (count[0], points))
+    return elapsed
+
+
+def main():
+    """Print points/s of each time mode, distinct and repeated timestamps"""
+    points = int(sys.argv[1]) if len(sys.argv) > 1 else POINTS
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    streams = [
+        ("distinct", lisptick_mock.timeserie_stream(points)),
+        # each timestamp repeated, as trades of a same instant
+        ("repeated", repeated_stream(points, repeat)),
+    ]
+    print("points: %d" % points)
+    for times, data in streams:
+        for name, mode, cache in MODES:
+            decoder = lisptick.time_decoder(mode, cache)
+            elapsed = bench(data, points, decoder)
+            print("%-8s %-12s %6.3f s %10.0f points/s" % (times, name, elapsed, points / elapsed))
+
+
+def repeated_stream(points, repeat):
+    """Float timeserie stream, each timestamp used repeat times"""
+    writer = lisptick_mock.StreamWriter()
+    step = lisptick_mock.STEP
+    return writer.timeserie(0, "", [
+        (lisptick_mock.START + (i // repeat) * step, float(i)) for i in range(points)
+    ]).end().getvalue()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Liquidity indicators read as a live stream, asked from 1 minute in past until next minute
+
+Stream is resumed from last received point after a stall or a lost connection.
+"""
+import datetime
+
+import lisptick
+
+HOST = "uat.lisptick.org"
+PORT = 12006
+
+def main():
+    """Show bid/ask spread and mininum available volume at 1st limit"""
+    conn = lisptick.Socket(HOST, PORT)
+
+    # $ spread
+    # mininum buy or sell volume in $, rounded to cent
+    request = """
+(def
+  code "BTC"
+  dt   1m
+)
+
+(defn spread[name start stop]
+  (-
+    (timeserie @ask-price "bitstamp" code start stop)
+    (timeserie @bid-price "bitstamp" code start stop)))
+
+(defn avusd[name start stop]
+  (round
+    (min
+      (*
+        (timeserie @ask-volume "bitstamp" code start stop)
+        (timeserie @ask-price "bitstamp" code start stop))
+      (*
+        (timeserie @bid-volume "bitstamp" code start stop)
+        (timeserie @bid-price "bitstamp" code start stop)))
+   -2))
+
+[
+  (spread code {start} (+ (now) dt))
+  (avusd code {start} (+ (now) dt))
+]
+"""
+    # one row of last spread and volume per point, heartbeats skipped
+    join = lisptick.AsOfJoin()
+    start = datetime.datetime.now() - datetime.timedelta(minutes=1)
+    # socket is closed when leaving the with block, even on break
+    with conn.live(request, start) as stream:
+        for time, (spread, usdvolume) in join.join(stream):
+            print(time, "spread: $", spread, "volume: $", usdvolume)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,44 @@
 """
 LispTick TimeSerie Streaming Server module
+Needs Python 3.5 or later, asyncio requests need Python 3.7 or later.
+numpy, pyarrow and pandas are optional. asyncio, mmap and tempfile are
+only imported by the features using them, keeping import light.
 To work on an Onion Omega2 needs:
 opkg update
-opkg install python-codecs
+opkg install python3
 """
+import array
+import collections
+import concurrent.futures
 import datetime
+import functools
+import hashlib
 import json
+import os
+import re
 import struct
 import socket
+import sys
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    # numpy is only needed by columnar results
+    numpy = None
+
+try:
+    import pyarrow
+except ImportError:
+    # pyarrow is only needed by Arrow exports
+    pyarrow = None
+
+try:
+    import pandas
+except ImportError:
+    # pandas is only needed by DataFrame exports
+    pandas = None
 
 # Types byte definition
 TNULL = b'\x00'
@@ -26,6 +57,114 @@ TDEC64 = b'\x0C'
 TPAIR = b'\x0D'
 THEARTBEAT = b'\x0E'
 TTENSOR = b'\x0F'
+# Type names by type byte, keys of ReaderStats.elements
+TYPE_NAMES = {
+    TNULL[0]: "null", TINT[0]: "int", TFLOAT[0]: "float", TTIME[0]: "time",
+    TDURATION[0]: "duration", TERROR[0]: "error", TSTRING[0]: "string",
+    TARRAY[0]: "array", TARRAYSERIAL[0]: "serial array", TTIMESERIE[0]: "timeserie",
+    TSENTINEL[0]: "sentinel", TBOOL[0]: "bool", TDEC64[0]: "dec64", TPAIR[0]: "pair",
+    THEARTBEAT[0]: "heartbeat", TTENSOR[0]: "tensor",
+}
+
+# Empty time sent by LispTick
+EMPTY_TIME = -6795364578871345152
+# UTC origin of epochs
+UTC_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+# numpy Not a Time as Int64
+NAT = -9223372036854775808
+
+# Time modes: local naive datetime, UTC datetime or NanoTime
+TIME_LOCAL = "local"
+TIME_UTC = "utc"
+TIME_NANO = "nano"
+
+# Initial number of points of a Column
+COLUMN_CAPACITY = 1024
+# Maximum number of points of an Arrow record batch walked by walk_arrow
+ARROW_BATCH_SIZE = 65536
+# Default number of points of a spilled timeserie chunk file
+SPILL_CHUNK_POINTS = 1 << 20
+
+# Receive buffer size, a recv_into call reads up to this many bytes
+BUFFER_SIZE = 65536
+# Default number of time windows and parallel requests of a sharded request
+SHARDS = 4
+# Default number of parallel requests of a batch, and maximum number of
+# received bytes of its results not yet returned
+BATCH_PARALLEL = 8
+BATCH_BUDGET = 1 << 28
+# Batch error policies: raise first error, or return it as its result
+ON_ERROR_RAISE = "raise"
+ON_ERROR_RETURN = "return"
+
+# Default maximum size in bytes of a ResultCache directory
+CACHE_MAX_SIZE = 1 << 30
+# Requests using current time are not cached
+UNCACHEABLE = [r"\(now\b"]
+
+# Default maximum number of simultaneous AsyncSocket connections
+MAX_CONCURRENCY = 64
+# Default number of idle connections kept by a ConnectionPool
+POOL_SIZE = 4
+# Idle connections older than this number of seconds are not used
+POOL_IDLE_TIMEOUT = 60.0
+
+# Backpressure policies of a full Route: wait for consumer, drop oldest
+# point or keep only latest point
+BLOCK = "block"
+DROP_OLDEST = "drop-oldest"
+CONFLATE = "conflate"
+# Default maximum number of points queued by a Route
+ROUTE_SIZE = 1024
+# Default seconds without any data, point or heartbeat, before a live
+# stream is considered stalled, to set above server heartbeat period
+LIVE_DEADLINE = 30.0
+# Seconds before first reconnection of a live stream, doubled on each
+# consecutive failure up to RECONNECT_MAX_DELAY
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+# Default size in bytes of a Pipeline RingBuffer
+RING_SIZE = 1 << 24
+# Maximum number of elements of a Pipeline batch, and default maximum
+# number of queued batches
+PIPELINE_BATCH = 256
+PIPELINE_QUEUE_SIZE = 64
+
+# AsOfJoin fill policies of missing or stale values: None, NaN, last
+# value even if stale, or no row
+FILL_NONE = "none"
+FILL_NAN = "nan"
+FILL_LAST = "last"
+FILL_DROP = "drop"
+# Default number of rows of an AsOfJoin batch
+JOIN_BATCH_SIZE = 1024
+
+# Downsampler methods: min and max points per time bucket, or Largest
+# Triangle Three Buckets on min and max points of finer buckets
+MINMAX = "minmax"
+LTTB = "lttb"
+# Default number of points of a Downsampler
+DOWNSAMPLE_POINTS = 5000
+# Number of min-max candidates per LTTB point
+LTTB_CANDIDATES = 4
+
+# Timeserie point record: type byte, 3 bytes uid, 8 bytes value, 8 bytes time
+POINT_RECORD_SIZE = 20
+# Minimum number of same timeserie points decoded at once
+BULK_MIN_RUN = 16
+# Point value types with a fixed 8 bytes encoding
+BULK_TYPES = (TINT[0], TFLOAT[0], TBOOL[0], TDEC64[0])
+# Serialized element record: type byte, 3 bytes uid, 8 bytes value
+ELEMENT_RECORD_SIZE = 12
+
+# Precompiled codecs, type byte and 3 bytes uid are read at once as UInt32
+HEAD_STRUCT = struct.Struct('<I')
+INT_STRUCT = struct.Struct('<q')
+FLOAT_STRUCT = struct.Struct('<d')
+DURATION_STRUCT = struct.Struct('<qqqq')
+# Whole timeserie point record: head, value and time
+INT_POINT_STRUCT = struct.Struct('<Iqq')
+FLOAT_POINT_STRUCT = struct.Struct('<Idq')
 
 
 class LispTickException(Exception):
@@ -39,8 +178,17 @@ class LispTickException(Exception):
         return self._msg
 
 
+class LimitReached(LispTickException):
+    """Result has more points than requested limit, result holds first ones"""
+
+    def __init__(self, msg, result):
+        super(LimitReached, self).__init__(msg)
+        self.result = result
+
+
 class Sentinel(int):
     """Sentinel object indicating end of a grid flow"""
+    __slots__ = ()
     Null = 0
     End = 1
     Marker = 2
@@ -48,13 +196,14 @@ class Sentinel(int):
 
 class InArray():
     """UID and position in an array"""
+    __slots__ = ('uid', 'pos')
 
     def __init__(self, init_uid, init_pos):
         self.uid = init_uid
         self.pos = init_pos
 
     def __str__(self):
-        return str(self.__class__) + ": " + str(self.__dict__)
+        return str(self.__class__) + ": " + str(slots_dict(self))
 
     def get_uid(self):
         """Element uniq id"""
@@ -67,111 +216,2853 @@ class InArray():
 
 class Duration():
     """LispTick duration time handling Year, Month, Day and microseconds (from nano)"""
+    __slots__ = ('year', 'month', 'timedelta')
 
     def __init__(self, init_year=0, init_month=0, init_day=0, init_epoch=0):
         self.year = init_year
         self.month = init_month
         self.timedelta = datetime.timedelta(init_day, 0, init_epoch / 1000)
 
-    def __str__(self):
-        return str(self.year) + "Y" + str(self.month) + "M" + str(self.timedelta)
+    def __str__(self):
+        return str(self.year) + "Y" + str(self.month) + "M" + str(self.timedelta)
+
+    def get_year(self):
+        """Number of years duration part"""
+        return self.year
+
+    def get_month(self):
+        """Number of month duration part"""
+        return self.month
+
+    def get_timedelta(self):
+        """micro seconds and days duration part as a timedelta"""
+        return self.timedelta
+
+
+class Point():
+    """A point is a value at a time"""
+    __slots__ = ('time', 'i')
+
+    def __init__(self, init_time, init_value):
+        self.time = init_time
+        self.i = init_value
+
+    def __str__(self):
+        return str(self.time) + " " + str(self.i)
+
+    def __len__(self):
+        return 2
+
+
+class HeartBeat():
+    """An HeartBeat is an information value that can be forgotten"""
+    __slots__ = ('value',)
+
+    def __init__(self, init_value):
+        self.value = init_value
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(slots_dict(self))
+
+    def get_value(self):
+        """HeartBeat value"""
+        return self.value
+
+class Tensor():
+    """Tensor  n-dimensional arrays"""
+    __slots__ = ('shape', 'values')
+
+    def __init__(self, shape, values=None):
+        self.shape = shape
+        if values is None:
+            values = [0] * self.get_size()
+        self.values = values
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(slots_dict(self))
+
+    def get_size(self):
+        """tensor size in number of values"""
+        size = 1
+        for i in self.shape:
+            size *= i
+        return size
+
+
+class TimeSerie():
+    """Timeserie stored in compact arrays, Point objects are built on access
+
+    times are nano seconds since epoch in an array('q'), values are in an
+    array('q'), array('d') or array('b') for int, float and bool values,
+    in a list otherwise. Mixed int and float values are stored as float.
+    """
+    __slots__ = ('label', 'times', 'values', 'typecode', 'time_decoder')
+
+    def __init__(self, label="", time_decoder=None):
+        self.label = label
+        self.times = array.array('q')
+        self.values = []
+        self.typecode = None
+        self.time_decoder = time_decoder_function(time_decoder)
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(
+            {"label": self.label, "size": len(self.times)})
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.times)))]
+        return Point(self.time_decoder(self.times[index]), self.get_value(index))
+
+    def __iter__(self):
+        for i in range(len(self.times)):
+            yield Point(self.time_decoder(self.times[i]), self.get_value(i))
+
+    def get_time(self, index):
+        """Point time in nano seconds since epoch"""
+        return self.times[index]
+
+    def get_value(self, index):
+        """Point value"""
+        if self.typecode == 'b':
+            return bool(self.values[index])
+        return self.values[index]
+
+    def append(self, point):
+        """Append a Point, its time as datetime or nano seconds"""
+        self.add(time_nano(point.time), point.i)
+
+    def add(self, time, value):
+        """Append value at time in nano seconds since epoch"""
+        typecode = value_typecode(value)
+        if typecode != self.typecode:
+            self._set_typecode(typecode)
+        self.times.append(time)
+        self.values.append(value)
+
+    def extend(self, times, values):
+        """Append numpy arrays of nano second times and values"""
+        if len(times) == 0:
+            return
+        typecode = {'bool': 'b', 'int64': 'q', 'float64': 'd'}.get(values.dtype.name)
+        if typecode != self.typecode:
+            self._set_typecode(typecode)
+        self.times.frombytes(times.astype('int64').tobytes())
+        if self.typecode is None:
+            self.values.extend(values.tolist())
+        else:
+            self.values.frombytes(values.astype(self.values.typecode).tobytes())
+
+    def _set_typecode(self, typecode):
+        # first value or mixed values types
+        if self.typecode is None and len(self.times) > 0:
+            # already a list
+            return
+        if len(self.times) == 0:
+            self.typecode = typecode
+        elif set((self.typecode, typecode)) == set(('q', 'd')):
+            self.typecode = 'd'
+        else:
+            self.values = [self.get_value(i) for i in range(len(self.values))]
+            self.typecode = None
+            return
+        if self.typecode is None:
+            self.values = []
+        else:
+            self.values = array.array(self.typecode, self.values)
+
+
+def value_typecode(value):
+    """array typecode used to store value in a TimeSerie, None for a list"""
+    if isinstance(value, bool):
+        return 'b'
+    if isinstance(value, int):
+        return 'q'
+    if isinstance(value, float):
+        return 'd'
+    return None
+
+
+class NanoTime(int):
+    """Time as nano seconds since epoch, datetime built on demand"""
+    __slots__ = ()
+
+    def __str__(self):
+        if self == EMPTY_TIME:
+            return str(datetime.time())
+        return epoch_utc(self).strftime("%Y-%m-%d %H:%M:%S.") + "%09d" % (self % 1000000000)
+
+    def __repr__(self):
+        return "NanoTime(" + int.__repr__(self) + ")"
+
+    def get_datetime(self):
+        """Local naive datetime, as decoded by default"""
+        return epoch_datetime(self)
+
+    def get_utc(self):
+        """UTC datetime, nano seconds truncated"""
+        return epoch_utc(self)
+
+
+def slots_dict(obj):
+    """Attributes of an object with __slots__ as a dict"""
+    return {name: getattr(obj, name) for name in obj.__slots__}
+
+
+class Column():
+    """Timeserie as contiguous numpy arrays of nano second times and values"""
+
+    def __init__(self, capacity=COLUMN_CAPACITY):
+        self.times = numpy.empty(capacity, dtype='int64')
+        self.values = None
+        self.dtype = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, time, value):
+        """Append a point, time in nano seconds since epoch"""
+        dtype = column_dtype(value)
+        if dtype != self.dtype:
+            self._set_dtype(dtype)
+        if self.size == len(self.times):
+            self._grow(self.size + 1)
+        self.times[self.size] = time
+        self.values[self.size] = value
+        self.size += 1
+
+    def extend(self, times, values):
+        """Append arrays of nano second times and values"""
+        if len(times) == 0:
+            return
+        dtype = values.dtype.name
+        if dtype != self.dtype:
+            self._set_dtype(dtype)
+        if self.size + len(times) > len(self.times):
+            self._grow(self.size + len(times))
+        self.times[self.size:self.size + len(times)] = times
+        self.values[self.size:self.size + len(times)] = values
+        self.size += len(times)
+
+    def get_times(self):
+        """Times as a datetime64[ns] array"""
+        return self.times[:self.size].view('datetime64[ns]')
+
+    def get_values(self):
+        """Values array"""
+        if self.values is None:
+            return numpy.empty(0, dtype='float64')
+        return self.values[:self.size]
+
+    def finish(self):
+        """Release unused capacity and return (times, values) arrays"""
+        self.times.resize(self.size, refcheck=False)
+        self.times[self.times == EMPTY_TIME] = NAT
+        if self.values is not None:
+            self.values.resize(self.size, refcheck=False)
+        return self.get_times(), self.get_values()
+
+    def _set_dtype(self, dtype):
+        # first value or mixed values types
+        if self.dtype is None:
+            self.values = numpy.empty(len(self.times), dtype=dtype)
+            self.dtype = dtype
+            return
+        if set((self.dtype, dtype)) == set(('int64', 'float64')):
+            dtype = 'float64'
+        else:
+            dtype = 'object'
+        if dtype != self.dtype:
+            self.values = self.values.astype(dtype)
+            self.dtype = dtype
+
+    def _grow(self, size):
+        # amortized doubling
+        capacity = max(2 * len(self.times), size)
+        self.times.resize(capacity, refcheck=False)
+        self.values.resize(capacity, refcheck=False)
+
+
+def column_dtype(value):
+    """numpy dtype name used to store value in a Column"""
+    if isinstance(value, bool):
+        return 'bool'
+    if isinstance(value, int):
+        return 'int64'
+    if isinstance(value, float):
+        return 'float64'
+    return 'object'
+
+
+def is_column(value):
+    """True if value is a timeserie of get_columns, a (times, values) pair"""
+    return (isinstance(value, tuple) and len(value) == 2
+            and isinstance(value[0], numpy.ndarray) and isinstance(value[1], numpy.ndarray))
+
+
+def aligned_columns(columns):
+    """Union of times of several timeseries and their values on these times
+
+    columns maps keys to (times, values) pairs. Returns times and a list
+    of (key, values, missing) where missing is a bool array, or None if
+    all timeseries have the same times. Of points at a same time of a
+    timeserie, last one is kept.
+    """
+    pairs = [(key, value) for key, value in columns.items() if is_column(value)]
+    if len(pairs) == 0:
+        return Column().finish()[0], []
+    times = pairs[0][1][0]
+    if all(numpy.array_equal(times, value[0]) for _, value in pairs[1:]):
+        return times, [(key, value[1], None) for key, value in pairs]
+    times = numpy.unique(numpy.concatenate([value[0] for _, value in pairs]))
+    res = []
+    for key, (ts_times, values) in pairs:
+        positions = numpy.searchsorted(times, ts_times)
+        full = numpy.zeros(len(times), dtype=values.dtype)
+        full[positions] = values
+        missing = numpy.ones(len(times), dtype=bool)
+        missing[positions] = False
+        res.append((key, full, missing))
+    return times, res
+
+
+def to_arrow(columns):
+    """pyarrow.Table of a get_columns result
+
+    A timeserie gives "time" and "value" columns, a dict of timeseries a
+    "time" column and one column per timeserie named by its key, null
+    where a timeserie has no point at that time. Numeric arrays are
+    shared, not copied, times are UTC timestamps.
+    """
+    if pyarrow is None:
+        raise LispTickException("pyarrow is needed for Arrow results")
+    if is_column(columns):
+        columns = {"value": columns}
+    if not isinstance(columns, dict):
+        raise LispTickException("Result has no timeserie")
+    times, aligned = aligned_columns(columns)
+    names = ["time"]
+    arrays = [pyarrow.array(times, type=pyarrow.timestamp('ns', tz='UTC'))]
+    for key, values, missing in aligned:
+        names.append(str(key))
+        arrays.append(pyarrow.array(values, mask=missing))
+    return pyarrow.Table.from_arrays(arrays, names=names)
+
+
+def to_pandas(columns):
+    """pandas.DataFrame of a get_columns result, indexed by UTC time
+
+    Columns are as by to_arrow, NaN where a timeserie has no point.
+    """
+    if pandas is None:
+        raise LispTickException("pandas is needed for DataFrame results")
+    if is_column(columns):
+        columns = {"value": columns}
+    if not isinstance(columns, dict):
+        raise LispTickException("Result has no timeserie")
+    times, aligned = aligned_columns(columns)
+    data = {}
+    index = pandas.DatetimeIndex(times, name="time").tz_localize("UTC")
+    for key, values, missing in aligned:
+        series = pandas.Series(values, index=index, copy=False)
+        data[key] = series if missing is None else series.where(~missing)
+    return pandas.DataFrame(data, index=index, copy=False)
+
+
+def arrow_batch(times, values):
+    """pyarrow.RecordBatch of "time" and "value" columns of a timeserie"""
+    return pyarrow.RecordBatch.from_arrays(
+        [pyarrow.array(times, type=pyarrow.timestamp('ns', tz='UTC')),
+         pyarrow.array(values)], names=["time", "value"])
+
+
+class ChunkWriter():
+    """Timeserie buffered in a Column, written as .npy chunk files when full"""
+
+    def __init__(self, directory, name, chunk_points=SPILL_CHUNK_POINTS):
+        self.directory = directory
+        self.name = name
+        self.chunk_points = chunk_points
+        self.column = Column(min(chunk_points, COLUMN_CAPACITY))
+        # index entries of written chunks
+        self.chunks = []
+        self.paths = []
+
+    def append(self, time, value):
+        """Append a point, time in nano seconds since epoch"""
+        self.column.append(time, value)
+        if len(self.column) >= self.chunk_points:
+            self.flush()
+
+    def extend(self, times, values):
+        """Append arrays of nano second times and values"""
+        self.column.extend(times, values)
+        if len(self.column) >= self.chunk_points:
+            self.flush()
+
+    def flush(self):
+        """Write buffered points as a chunk"""
+        if len(self.column) == 0:
+            return
+        times, values = self.column.finish()
+        self.column = Column(min(self.chunk_points, COLUMN_CAPACITY))
+        base = "%s_%d" % (self.name, len(self.chunks))
+        path = os.path.join(self.directory, base + ".times.npy")
+        self.paths.append(path)
+        numpy.save(path, times)
+        if values.dtype == object:
+            # objects as wire elements, never pickled
+            path = os.path.join(self.directory, base + ".values.bin")
+            self.paths.append(path)
+            write_elements(path, values)
+        else:
+            path = os.path.join(self.directory, base + ".values.npy")
+            self.paths.append(path)
+            numpy.save(path, values)
+        epochs = times.view('int64')
+        self.chunks.append({"file": base, "size": len(times), "dtype": values.dtype.str,
+                            "first": int(epochs[0]), "last": int(epochs[-1])})
+
+    def remove(self):
+        """Remove written chunks"""
+        for path in self.paths:
+            remove_file(path)
+        self.chunks = []
+        self.paths = []
+
+
+class SpilledResult():
+    """Timeseries written to .npy chunk files by spill, read memory mapped
+
+    Each timeserie is split in chunks of about chunk_points points whose
+    first and last times are indexed in index.json, so a time range is
+    read from overlapping chunks only. A timeserie is keyed by its label,
+    or its uid if label is empty or not unique. Values of type object,
+    as strings, are saved as LispTick wire elements, not memory mapped but
+    decoded when loaded.
+    """
+
+    INDEX = "index.json"
+    OTHERS = "others.bin"
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, self.INDEX)) as index:
+            self.index = json.load(index)
+        self.timeseries = collections.OrderedDict(
+            (entry["key"], entry) for entry in self.index["timeseries"])
+
+    def __len__(self):
+        """Total number of points"""
+        return sum(chunk["size"] for entry in self.timeseries.values()
+                   for chunk in entry["chunks"])
+
+    def keys(self):
+        """Timeseries keys, in result order"""
+        return list(self.timeseries)
+
+    def get_chunks(self, key=None):
+        """List of (times, values) arrays of each chunk of timeserie key
+
+        key can be omitted for a result with a single timeserie.
+        """
+        return [self._load(chunk) for chunk in self._entry(key)["chunks"]]
+
+    def get_columns(self, key=None, start=None, stop=None):
+        """(times, values) of timeserie key in [start, stop[ time range
+
+        start and stop are datetime, numpy datetime64 or nano seconds since
+        epoch, None for no bound, naive datetime being local times. A range
+        in a single chunk is a view of its memory mapped arrays, else only
+        overlapping chunks are read and concatenated.
+        """
+        first = nano_bound(start)
+        last = nano_bound(stop)
+        parts = []
+        for chunk in self._entry(key)["chunks"]:
+            if first is not None and chunk["last"] < first:
+                continue
+            if last is not None and chunk["first"] >= last:
+                break
+            times, values = self._load(chunk)
+            epochs = times.view('int64')
+            begin = 0 if first is None else numpy.searchsorted(epochs, first)
+            end = len(epochs) if last is None else numpy.searchsorted(epochs, last)
+            parts.append((times[begin:end], values[begin:end]))
+        if len(parts) == 0:
+            return Column().finish()
+        if len(parts) == 1:
+            return parts[0]
+        return (numpy.concatenate([part[0] for part in parts]),
+                numpy.concatenate([part[1] for part in parts]))
+
+    def get_others(self):
+        """Values of result that are not timeseries, by root array position"""
+        path = os.path.join(self.directory, self.OTHERS)
+        if not os.path.exists(path):
+            return {}
+        values = read_elements(path, len(self.index["others"]))
+        return dict(zip(self.index["others"], values.tolist()))
+
+    def _entry(self, key):
+        # index entry of timeserie key, the only one if key is None
+        if key is None:
+            if len(self.timeseries) != 1:
+                raise LispTickException("Result has %d timeseries, a key is needed" %
+                                        len(self.timeseries))
+            return list(self.timeseries.values())[0]
+        return self.timeseries[key]
+
+    def _load(self, chunk):
+        # memory mapped times and values of chunk, loaded if objects
+        path = os.path.join(self.directory, chunk["file"])
+        times = numpy.load(path + ".times.npy", mmap_mode='r')
+        if numpy.dtype(chunk["dtype"]) == object:
+            values = read_elements(path + ".values.bin", chunk["size"])
+        else:
+            values = numpy.load(path + ".values.npy", mmap_mode='r')
+        return times, values
+
+
+def write_elements(path, values):
+    """Write values to path as LispTick wire elements"""
+    with open(path, "wb") as out:
+        for value in values:
+            out.write(encode_element(value))
+
+
+def read_elements(path, size):
+    """numpy object array of size values read by write_elements"""
+    values = numpy.empty(size, dtype=object)
+    with open(path, "rb") as data:
+        reader = LisptickReader(data)
+        for i in range(size):
+            idt = reader.recv_buffer.read_type()
+            if idt is None:
+                raise LispTickException("Spilled values truncated in " + path)
+            values[i] = reader._serial_get(idt)
+    return values
+
+
+def nano_bound(time):
+    """Nano seconds since epoch of a time range bound, None if None"""
+    if time is None:
+        return None
+    if isinstance(time, numpy.datetime64):
+        return int(time.astype('datetime64[ns]').astype('int64'))
+    return time_nano(time)
+
+
+class Socket():
+    """Request LispTick by socket"""
+
+    def __init__(self, host, port, cache=None, time_decoder=None):
+        self.__host = host
+        self.__port = port
+        # optional ResultCache
+        self.cache = cache
+        # time mode or function from nano seconds to time, see time_decoder
+        self.time_decoder = time_decoder
+        # StatsHooks instrumenting each request, None for no instrumentation
+        self.hooks = None
+
+    def get_result(self, request, compact=False, limit=-1, partial=False):
+        """Send resquest to server and return result
+
+        With compact=True timeseries are TimeSerie instead of lists of Point.
+        With limit, connection is closed as soon as limit points are read,
+        see LisptickReader.get_result.
+        """
+        return self._request(request, lambda reader: reader.get_result(limit, compact, partial))
+
+    def get_columns(self, request, limit=-1, partial=False):
+        """Send request to server and return result with numpy timeseries"""
+        return self._request(request, lambda reader: reader.get_columns(limit, partial))
+
+    def walk_arrow(self, request, func, batch_size=ARROW_BATCH_SIZE):
+        """Call func on pyarrow record batches of result timeseries
+
+        see LisptickReader.walk_arrow.
+        """
+        err_msg = self._request(request, lambda reader: reader.walk_arrow(func, batch_size))
+        if err_msg != "":
+            raise LispTickException(err_msg)
+
+    def spill(self, request, directory, chunk_points=SPILL_CHUNK_POINTS):
+        """Send request to server, write timeseries to directory
+
+        Returns a SpilledResult, see LisptickReader.spill.
+        """
+        return self._request(request, lambda reader: reader.spill(directory, chunk_points))
+
+    def walk_result(self, request, func, limit=-1):
+        """Call func on each part of result, at most limit parts if not -1
+
+        func can also call stop on the reader it gets to abort the result.
+        """
+        err_msg = self._request(request, lambda reader: reader.walk_result(func, limit))
+        if err_msg != "":
+            raise LispTickException(err_msg)
+
+    def live(self, template, start, deadline=LIVE_DEADLINE, retries=-1):
+        """Send template from start and return a LiveStream of (uid, value)
+
+        {start} in template is replaced by start, a datetime, then by
+        last received point time when request is resumed after a stall
+        of deadline seconds or a lost connection. retries if not -1 is
+        the maximum number of consecutive failed reconnections.
+        """
+        return LiveStream(self, template, start, deadline, retries)
+
+    def pipeline(self, request, ring_size=RING_SIZE, queue_size=PIPELINE_QUEUE_SIZE):
+        """Send request to server and return a Pipeline of (uid, value)"""
+        sock = self._send(request)
+        return Pipeline(sock, self._release, self.time_decoder, ring_size, queue_size)
+
+    def stream(self, request, limit=-1):
+        """Send request to server and return a Stream of (uid, value)
+
+        Stream ends after limit elements if not -1. A cached result is
+        replayed, a result not cached yet is not recorded.
+        """
+        data = self._cached_data(request)
+        if data is not None:
+            return Stream(data, None, self.time_decoder, limit, self.hooks, True)
+        sock = self._send(request)
+        return Stream(sock, self._release, self.time_decoder, limit, self.hooks)
+
+    def record(self, request, path, func=None):
+        """Save raw result of request to path, calling func like walk_result"""
+        sock = self._send(request)
+        try:
+            with open(path, "wb") as out:
+                reader = self._reader(Recorder(sock, out))
+                for uid, value in reader.iter_result():
+                    if func is not None:
+                        func(reader, uid, value)
+        except BaseException:
+            self._release(sock, None, False)
+            raise
+        self._release(sock, reader)
+        if reader.error != "":
+            raise LispTickException(reader.error)
+
+    def get_sharded(self, template, start, stop, shards=SHARDS, parallel=SHARDS,
+                    columns=False):
+        """Send template for time windows concurrently, merge them in time order
+
+        template is a timeserie request where {start} and {stop} are replaced
+        by each window bounds. start and stop are datetime, naive ones being
+        local times like received points. Result is a list of Point, or a
+        (times, values) pair of numpy arrays with columns=True.
+        """
+        parts = list(self.iter_sharded(template, start, stop, shards, parallel, columns))
+        if columns:
+            if len(parts) == 0:
+                return Column().finish()
+            return (numpy.concatenate([part[0] for part in parts]),
+                    numpy.concatenate([part[1] for part in parts]))
+        res = []
+        for part in parts:
+            res.extend(part)
+        return res
+
+    def iter_sharded(self, template, start, stop, shards=SHARDS, parallel=SHARDS,
+                     columns=False):
+        """Generator of get_sharded windows results, in time order
+
+        At most parallel windows are requested or held at a time, a window
+        received before previous ones waits until they have been yielded.
+        """
+        bounds = shard_bounds(start, stop, shards)
+        executor = concurrent.futures.ThreadPoolExecutor(parallel)
+        pending = collections.deque()
+        try:
+            shard = 0
+            while shard < len(bounds) - 1 or len(pending) > 0:
+                while shard < len(bounds) - 1 and len(pending) < parallel:
+                    pending.append(executor.submit(
+                        self._get_shard, template, bounds[shard], bounds[shard + 1],
+                        shard == len(bounds) - 2, columns))
+                    shard += 1
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def get_results(self, requests, max_parallel=BATCH_PARALLEL, budget=BATCH_BUDGET,
+                    on_error=ON_ERROR_RAISE, columns=False):
+        """Send independent requests concurrently, return their results in order
+
+        See iter_results. With on_error=ON_ERROR_RETURN the exception
+        raised by a failed request is returned as its result.
+        """
+        requests = list(requests)
+        res = [None] * len(requests)
+        for index, result in self.iter_results(requests, max_parallel, budget, on_error,
+                                               columns=columns):
+            res[index] = result
+        return res
+
+    def iter_results(self, requests, max_parallel=BATCH_PARALLEL, budget=BATCH_BUDGET,
+                     on_error=ON_ERROR_RAISE, ordered=True, columns=False):
+        """Generator of (index, result) of requests sent by max_parallel threads
+
+        Results are yielded in requests order, or as they complete if not
+        ordered, as by get_result or get_columns with columns=True.
+        Receiving stops while results not yet yielded hold more than budget
+        received bytes, except for the first of them, so memory stays
+        bounded whatever consumer speed. With ON_ERROR_RAISE, first error
+        is raised and remaining requests are cancelled, with ON_ERROR_RETURN
+        the exception is yielded as result of its request.
+        """
+        requests = list(requests)
+        budget = ByteBudget(budget)
+        executor = concurrent.futures.ThreadPoolExecutor(max_parallel)
+        futures = [executor.submit(self._get_batched, index, request, budget, columns)
+                   for index, request in enumerate(requests)]
+        indexes = {future: index for index, future in enumerate(futures)}
+        try:
+            if ordered:
+                done = iter(futures)
+            else:
+                done = concurrent.futures.as_completed(futures)
+            for future in done:
+                index = indexes[future]
+                try:
+                    result = future.result()
+                except Exception as err:
+                    if on_error != ON_ERROR_RETURN:
+                        raise
+                    result = err
+                budget.release(index)
+                yield index, result
+        finally:
+            for future in futures:
+                future.cancel()
+            # wake up requests waiting for budget
+            budget.close()
+            executor.shutdown(wait=True)
+
+    def _get_batched(self, index, request, budget, columns):
+        """Result of a batched request, received bytes counted in budget"""
+        return self._request(
+            request, lambda reader: reader.get_columns() if columns else reader.get_result(),
+            lambda sock: BudgetSocket(sock, budget, index))
+
+    def _get_shard(self, template, first, last, is_last, columns):
+        """Points of template in [first, last[ window, last included if is_last"""
+        request = template.replace("{start}", lisptick_time(first))
+        request = request.replace("{stop}", lisptick_time(last))
+        if columns:
+            res = self.get_columns(request)
+            if not isinstance(res, tuple):
+                # no point
+                return Column().finish()
+            # a window stop may be included by server, keep it for next one
+            epochs = res[0].view('int64')
+            keep = epochs >= first * 1000000000
+            if is_last:
+                keep &= epochs <= last * 1000000000
+            else:
+                keep &= epochs < last * 1000000000
+            return res[0][keep], res[1][keep]
+        res = self.get_result(request)
+        if not isinstance(res, list):
+            # no point
+            return []
+        # times may be datetimes, naive or not, or nano seconds
+        first *= 1000000000
+        last *= 1000000000
+        if is_last:
+            return [point for point in res if first <= time_nano(point.time) <= last]
+        return [point for point in res if first <= time_nano(point.time) < last]
+
+    def _request(self, request, read, wrap=None):
+        """Send request and return read(reader), reader decoding its result
+
+        A cached result is read from its recorded file. A cacheable one is
+        recorded while read, and cached only if read to the end, so a
+        limited or stopped read still ends as soon as it can. Socket is
+        given to wrap, if any, and reader reads from what wrap returns.
+        Socket is released once read, released as failed on error.
+        """
+        data = self._cached_data(request)
+        if data is not None:
+            try:
+                return read(self._reader(data, True))
+            finally:
+                close_mmap(data)
+        temp = None
+        out = None
+        sock = self._send(request)
+        try:
+            con = sock if wrap is None else wrap(sock)
+            if self.cache is not None and self.cache.is_cacheable(request):
+                temp = self.cache.temp_path()
+                out = open(temp, "wb")
+                con = Recorder(con, out)
+            reader = self._reader(con)
+            res = read(reader)
+        except BaseException:
+            self._release(sock, None, False)
+            if out is not None:
+                out.close()
+            if temp is not None:
+                remove_file(temp)
+            raise
+        self._release(sock, reader)
+        if out is not None:
+            out.close()
+            if reader.complete and reader.error == "":
+                self.cache.put(self.__host, self.__port, request, temp)
+            else:
+                remove_file(temp)
+        return res
+
+    def _send(self, request):
+        """Connected socket request has been sent to, released on error"""
+        sock = self._connect()
+        try:
+            send_message(sock, request)
+        except BaseException:
+            self._release(sock, None, False)
+            raise
+        return sock
+
+    def _cached_data(self, request):
+        """Memory mapped cached raw result of request, None if not cached yet
+        or uncacheable"""
+        if self.cache is None or not self.cache.is_cacheable(request):
+            return None
+        return self.cache.open(self.__host, self.__port, request)
+
+    def _reader(self, con, cached=False):
+        """LisptickReader of a request result, instrumented if hooks is set"""
+        reader = LisptickReader(con, time_decoder=self.time_decoder)
+        if self.hooks is not None:
+            reader.instrument(self.hooks, cached)
+        return reader
+
+    def _connect(self):
+        """Socket connected to LispTick server"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.connect((self.__host, self.__port))
+        return sock
+
+    def _release(self, sock, _, ok=True):
+        """Socket is no more used, result has been read by reader, or not if
+        request failed"""
+        sock.close()
+
+
+class PoolStats():
+    """Connect and query times of a ConnectionPool, in seconds"""
+
+    def __init__(self):
+        self.connects = 0
+        self.connect_time = 0.0
+        self.failed_checks = 0
+        self.acquires = 0
+        self.acquire_time = 0.0
+        self.reused = 0
+        self.queries = 0
+        self.failed = 0
+        self.query_time = 0.0
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+
+class ConnectionPool():
+    """Connections to a LispTick server opened ahead of demand
+
+    Up to size idle connections are kept ready. A connection serves one
+    request and is replaced in background each time one is taken. With
+    reuse=True, for servers accepting several requests per connection,
+    a connection whose result ended with Sentinel.End is put back instead.
+    """
+
+    def __init__(self, host, port, size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 reuse=False, nodelay=True, rcvbuf=None, keepalive=True):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.reuse = reuse
+        self.nodelay = nodelay
+        self.rcvbuf = rcvbuf
+        self.keepalive = keepalive
+        self.stats = PoolStats()
+        # idle connections as (socket, idle since)
+        self.idle = []
+        self.lock = threading.Lock()
+        self.refilling = False
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open_connection(self):
+        """New connected socket with pool socket options"""
+        start = time.perf_counter()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.rcvbuf is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        if self.keepalive:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        try:
+            sock.connect((self.host, self.port))
+        except BaseException:
+            sock.close()
+            raise
+        with self.lock:
+            self.stats.connects += 1
+            self.stats.connect_time += time.perf_counter() - start
+        return sock
+
+    def acquire(self):
+        """Healthy idle connection, or a new one if none is ready"""
+        start = time.perf_counter()
+        sock = None
+        while sock is None:
+            with self.lock:
+                if len(self.idle) == 0:
+                    break
+                sock, since = self.idle.pop()
+            if time.monotonic() - since > self.idle_timeout or not is_alive(sock):
+                with self.lock:
+                    self.stats.failed_checks += 1
+                sock.close()
+                sock = None
+        if sock is None:
+            sock = self.open_connection()
+        if not self.reuse:
+            # reused connections come back, others are replaced ahead
+            self.refill()
+        with self.lock:
+            self.stats.acquires += 1
+            self.stats.acquire_time += time.perf_counter() - start
+        return sock
+
+    def release(self, sock, reader, query_time=0.0, ok=True):
+        """Put back or close a connection whose result has been read, closed
+        if its request failed"""
+        extra = []
+        with self.lock:
+            self.stats.queries += 1
+            self.stats.query_time += query_time
+            if not ok:
+                self.stats.failed += 1
+            if (ok and self.reuse and not self.closed and reader is not None
+                    and reader.complete and reader.error == ""
+                    and reader.recv_buffer.available() == 0):
+                self.stats.reused += 1
+                self.idle.append((sock, time.monotonic()))
+                # keep most recent connections
+                extra = self.idle[:-self.size] if self.size > 0 else self.idle
+                self.idle = self.idle[len(extra):]
+                sock = None
+        for old, _ in extra:
+            old.close()
+        if sock is not None:
+            sock.close()
+
+    def refill(self):
+        """Open idle connections up to pool size in a background thread"""
+        with self.lock:
+            if self.refilling or self.closed or len(self.idle) >= self.size:
+                return
+            self.refilling = True
+        thread = threading.Thread(target=self._refill)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        """Close idle connections, connections in use are closed on release"""
+        with self.lock:
+            self.closed = True
+            idle = self.idle
+            self.idle = []
+        for sock, _ in idle:
+            sock.close()
+
+    def _refill(self):
+        # open connections until pool is full
+        try:
+            while True:
+                with self.lock:
+                    if self.closed or len(self.idle) >= self.size:
+                        return
+                sock = self.open_connection()
+                with self.lock:
+                    if self.closed:
+                        sock.close()
+                        return
+                    self.idle.append((sock, time.monotonic()))
+        except OSError:
+            # server unreachable, next acquire connects by itself
+            return
+        finally:
+            with self.lock:
+                self.refilling = False
+
+
+class ByteBudget():
+    """Received bytes of a batch results not yet returned, bounded by size
+
+    A request waits for budget unless it is the first result not yet
+    returned, which always goes on so that the batch never deadlocks.
+    """
+
+    def __init__(self, size=BATCH_BUDGET):
+        self.size = size
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        # bytes by request index, and returned indexes after head
+        self.held = {}
+        self.released = set()
+        self.head = 0
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def acquire(self, index, size):
+        """Wait until size bytes can be received for request index"""
+        with self.cond:
+            while (not self.closed and index != self.head and self.used > 0
+                   and self.used + size > self.size):
+                self.waits += 1
+                self.cond.wait()
+            if self.closed:
+                raise LispTickException("Batch is closed")
+            self.used += size
+            self.peak = max(self.peak, self.used)
+            self.held[index] = self.held.get(index, 0) + size
+
+    def give_back(self, index, size):
+        """Return size acquired bytes not received"""
+        with self.cond:
+            self.used -= size
+            self.held[index] -= size
+            self.cond.notify_all()
+
+    def release(self, index):
+        """Result of request index is returned, its bytes are free"""
+        with self.cond:
+            self.used -= self.held.pop(index, 0)
+            self.released.add(index)
+            while self.head in self.released:
+                self.released.remove(self.head)
+                self.head += 1
+            self.cond.notify_all()
+
+    def close(self):
+        """Batch is over, waiting requests raise"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class BudgetSocket():
+    """Socket proxy counting received bytes of request index in a ByteBudget"""
+
+    def __init__(self, init_con, budget, index):
+        self.con = init_con
+        self.budget = budget
+        self.index = index
+
+    def recv_into(self, buffer):
+        """Receive into buffer once its size fits in budget"""
+        size = len(buffer)
+        self.budget.acquire(self.index, size)
+        try:
+            received = self.con.recv_into(buffer)
+        except BaseException:
+            self.budget.give_back(self.index, size)
+            raise
+        self.budget.give_back(self.index, size - received)
+        return received
+
+    def close(self):
+        """Close proxied socket"""
+        self.con.close()
+
+
+class Session(Socket):
+    """Socket taking its connections from a ConnectionPool"""
+
+    def __init__(self, host, port, size=POOL_SIZE, idle_timeout=POOL_IDLE_TIMEOUT,
+                 reuse=False, nodelay=True, rcvbuf=None, keepalive=True, cache=None,
+                 time_decoder=None):
+        super(Session, self).__init__(host, port, cache, time_decoder)
+        self.pool = ConnectionPool(host, port, size, idle_timeout, reuse,
+                                   nodelay, rcvbuf, keepalive)
+        self.stats = self.pool.stats
+        # query start time by socket
+        self.started = {}
+        self.pool.refill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Close pooled connections"""
+        self.pool.close()
+
+    def _connect(self):
+        """Socket taken from pool"""
+        sock = self.pool.acquire()
+        self.started[sock] = time.perf_counter()
+        return sock
+
+    def _release(self, sock, reader, ok=True):
+        """Socket given back to pool"""
+        query_time = time.perf_counter() - self.started.pop(sock, time.perf_counter())
+        self.pool.release(sock, reader, query_time, ok)
+
+
+def shard_bounds(start, stop, shards):
+    """shards+1 window bounds from start to stop, as whole epoch seconds"""
+    first = int(start.timestamp())
+    last = int(stop.timestamp())
+    shards = max(1, min(shards, last - first))
+    return [first + (last - first) * i // shards for i in range(shards + 1)]
+
+
+def lisptick_time(epoch):
+    """LispTick UTC time from epoch seconds"""
+    utc = datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc)
+    return utc.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def is_alive(sock):
+    """Check an idle socket is neither closed nor receiving unexpected data"""
+    try:
+        sock.setblocking(False)
+        # b'' if closed, data would be left from a previous result
+        sock.recv(1, socket.MSG_PEEK)
+        return False
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    finally:
+        try:
+            sock.setblocking(True)
+        except OSError:
+            pass
+
+
+class AsyncSocket():
+    """Request LispTick with asyncio, many requests sharing one event loop"""
+
+    def __init__(self, host, port, max_concurrency=MAX_CONCURRENCY, time_decoder=None):
+        self.__host = host
+        self.__port = port
+        import asyncio
+        # limit number of simultaneous connections
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.time_decoder = time_decoder
+
+    async def get_result(self, request, limit=-1, partial=False):
+        """Send resquest to server and return result"""
+        context = ReaderContext(limit)
+        async with self.stream(request) as stream:
+            closure = stream.reader._result_closure(context)
+            async for uid, value in stream:
+                closure(stream.reader, uid, value)
+                if context.limit_reached:
+                    break
+        return stream.reader._context_result(context, "", partial)
+
+    def stream(self, request):
+        """AsyncStream of (uid, value), to use with async with and async for"""
+        return AsyncStream(self.__host, self.__port, request, self.semaphore,
+                           self.time_decoder)
+
+
+class AsyncStream():
+    """Asynchronous iterator of (uid, value) decoded from a LispTick result"""
+
+    def __init__(self, host, port, request, semaphore, time_decoder=None):
+        self.host = host
+        self.port = port
+        self.request = request
+        self.semaphore = semaphore
+        self.time_decoder = time_decoder
+        self.con = None
+        self.stream_reader = None
+        self.reader = None
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.con is None:
+            await self.open()
+        if self.closed:
+            raise StopAsyncIteration
+        recv = self.reader.recv_buffer
+        while True:
+            # element start, read again from here if incomplete
+            mark = recv.start
+            try:
+                element = self.reader.read_element()
+            except NeedMoreData as need:
+                recv.start = mark
+                # at least bytes already buffered, linear time on big elements
+                await self._receive(max(need.missing, recv.end - mark))
+                continue
+            except Exception:
+                await self.close()
+                raise
+            if element is None:
+                await self.close()
+                if self.reader.error != "":
+                    raise LispTickException(self.reader.error)
+                raise StopAsyncIteration
+            return element
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def open(self):
+        """Wait for a free connection slot, connect and send request"""
+        if self.con is not None:
+            return
+        import asyncio
+        await self.semaphore.acquire()
+        try:
+            self.stream_reader, self.con = await asyncio.open_connection(
+                self.host, self.port)
+        except Exception:
+            self.semaphore.release()
+            self.closed = True
+            raise
+        self.reader = LisptickReader(self.con, time_decoder=self.time_decoder)
+        self.reader.recv_buffer = AsyncRecvBuffer()
+        self.con.write(encode_message(self.request))
+        await self.con.drain()
+
+    async def close(self):
+        """Close connection and free its slot"""
+        if self.closed or self.con is None:
+            self.closed = True
+            return
+        self.closed = True
+        self.con.close()
+        self.semaphore.release()
+        try:
+            await self.con.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+    async def _receive(self, need):
+        # receive at least need bytes, less only if connection is closed
+        received = 0
+        while received < need:
+            data = await self.stream_reader.read(max(BUFFER_SIZE, need - received))
+            if data == b'':
+                self.reader.recv_buffer.eof = True
+                return
+            self.reader.recv_buffer.feed(data)
+            received += len(data)
+
+
+class Stream():
+    """Iterator of (uid, value) lazily decoded from a LispTick result
+
+    Socket is closed at the end of the result, on error, or when leaving
+    a with block, so a consumer can stop at any time.
+    """
+
+    def __init__(self, init_con, release=None, time_decoder=None, limit=-1, hooks=None,
+                 cached=False):
+        self.con = init_con
+        self.reader = LisptickReader(init_con, time_decoder=time_decoder)
+        if hooks is not None:
+            self.reader.instrument(hooks, cached)
+        self.walker = self.reader.iter_result(limit)
+        self.closed = False
+        # called with (socket, reader) instead of closing socket
+        self.release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.closed:
+            raise StopIteration
+        try:
+            return next(self.walker)
+        except StopIteration:
+            self.close()
+            if self.reader.error != "":
+                raise LispTickException(self.reader.error)
+            raise
+        except Exception:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        """Stop decoding and close socket"""
+        if self.closed:
+            return
+        self.closed = True
+        self.walker.close()
+        if self.release is None:
+            # a bytes or memory mapped result has nothing or its mapping to close
+            self.reader._close()
+        else:
+            self.release(self.con, self.reader)
+
+
+class Route():
+    """Bounded queue of the points of a timeserie dispatched by a Demux
+
+    When full, policy BLOCK waits for the consumer, DROP_OLDEST drops the
+    oldest point and CONFLATE keeps only the latest point. A maxsize of 0
+    or less is unbounded, as for queue.Queue. Points are consumed by
+    iteration, or by handler called from a dedicated thread.
+    """
+
+    def __init__(self, key, handler=None, maxsize=ROUTE_SIZE, policy=BLOCK):
+        if policy not in (BLOCK, DROP_OLDEST, CONFLATE):
+            raise LispTickException("Unknown backpressure policy " + str(policy))
+        self.key = key
+        # called with (uid, point) for each point
+        self.handler = handler
+        self.maxsize = maxsize
+        self.policy = policy
+        self.points = collections.deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        # number of points dropped by policy
+        self.dropped = 0
+        # maximum number of queued points
+        self.max_depth = 0
+        # exception raised by handler
+        self.error = None
+        self.thread = None
+
+    def __iter__(self):
+        while True:
+            item = self.get()
+            if item is None:
+                return
+            yield item
+
+    def put(self, uid, point):
+        """Queue a point, dropped if route is closed"""
+        with self.cond:
+            if self.policy == CONFLATE:
+                self.dropped += len(self.points)
+                self.points.clear()
+            elif 0 < self.maxsize <= len(self.points):
+                if self.policy == DROP_OLDEST:
+                    self.points.popleft()
+                    self.dropped += 1
+                while len(self.points) >= self.maxsize and not self.closed:
+                    self.cond.wait()
+            if self.closed:
+                return
+            self.points.append((uid, point))
+            if len(self.points) > self.max_depth:
+                self.max_depth = len(self.points)
+            self.cond.notify_all()
+
+    def get(self):
+        """Next (uid, point), None once closed and empty"""
+        with self.cond:
+            while not self.points:
+                if self.closed:
+                    return None
+                self.cond.wait()
+            item = self.points.popleft()
+            self.cond.notify_all()
+            return item
+
+    def close(self):
+        """No more points, queued ones can still be read"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def start(self):
+        """Start handler thread, if any"""
+        if self.handler is not None:
+            self.thread = threading.Thread(target=self._consume, daemon=True)
+            self.thread.start()
+
+    def _consume(self):
+        # call handler until the end, points are dropped after an error
+        try:
+            for uid, point in self:
+                self.handler(uid, point)
+        except Exception as err:
+            self.error = err
+            self.close()
+
+
+class Demux():
+    """Dispatch points of a Stream to a Route per timeserie
+
+    A reader thread decodes stream and routes each point by timeserie
+    label, or uid if label is empty or not routed, so that a slow consumer
+    only delays its own timeserie. Other values and heartbeats are skipped.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.routes = {}
+        # Route or None by uid
+        self.by_uid = {}
+        # number of timeserie points without route
+        self.unrouted = 0
+        # exception raised while reading stream
+        self.error = None
+        self.stopped = False
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *_):
+        self.close()
+
+    def route(self, key, handler=None, maxsize=ROUTE_SIZE, policy=BLOCK):
+        """Route timeserie with label or uid key, return its Route"""
+        route = Route(key, handler, maxsize, policy)
+        self.routes[key] = route
+        return route
+
+    def start(self):
+        """Start handler threads and reader thread"""
+        for route in self.routes.values():
+            route.start()
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+        return self
+
+    def join(self, timeout=None):
+        """Wait for the end of result and of handlers, raise their error"""
+        end = None if timeout is None else time.monotonic() + timeout
+        for thread in [self.thread] + [route.thread for route in self.routes.values()]:
+            if thread is not None:
+                thread.join(None if end is None else max(0.0, end - time.monotonic()))
+        if self.error is not None:
+            raise self.error
+        for route in self.routes.values():
+            if route.error is not None:
+                raise route.error
+
+    def close(self):
+        """Stop reading, queued points can still be read"""
+        self.stopped = True
+        self.stream.reader.stop()
+        # wake up reader thread waiting for data
+        shutdown = getattr(self.stream.con, "shutdown", None)
+        if shutdown is not None:
+            try:
+                shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        for route in self.routes.values():
+            route.close()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def _read(self):
+        # reader thread, dispatch stream points to routes
+        try:
+            for uid, value in self.stream:
+                route = self.by_uid.get(uid, False)
+                if route is False:
+                    route = self._find_route(uid)
+                    self.by_uid[uid] = route
+                if route is not None:
+                    route.put(uid, value)
+                elif uid in self.stream.reader.tserie:
+                    self.unrouted += 1
+        except Exception as err:
+            if not self.stopped:
+                self.error = err
+        finally:
+            self.stream.close()
+            for route in self.routes.values():
+                route.close()
+
+    def _find_route(self, uid):
+        # route of timeserie uid, None if not a timeserie or not routed
+        label = self.stream.reader.tserie.get(uid)
+        if label is None:
+            return None
+        route = self.routes.get(label) if label != "" else None
+        if route is None:
+            route = self.routes.get(uid)
+        return route
+
+
+class AsOfJoin():
+    """As-of join of the timeseries of a result array, a row per point
+
+    Each point sets the last value of its column, its position in root
+    array, then a (time, values) row of last values of every column is
+    returned, given to on_row and gathered in columnar batches of
+    batch_size rows given to on_batch(times, columns).
+    Scalar values of the array are kept in every row of their column.
+    Missing values and values older than tolerance, a timedelta, are
+    filled according to fill policy.
+    """
+
+    def __init__(self, tolerance=None, fill=FILL_NONE, on_row=None,
+                 on_batch=None, batch_size=JOIN_BATCH_SIZE):
+        if fill not in (FILL_NONE, FILL_NAN, FILL_LAST, FILL_DROP):
+            raise LispTickException("Unknown fill policy " + str(fill))
+        self.tolerance = tolerance
+        # same tolerance for nano second times
+        self.tolerance_ns = None
+        if tolerance is not None:
+            self.tolerance_ns = nano_duration(tolerance)
+        self.fill = fill
+        self.on_row = on_row
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        # column by uid, last value and time by column
+        self.columns = {}
+        self.values = []
+        self.times = []
+        # number of columns without value yet
+        self.missing = 0
+        # columns of scalar values, never stale
+        self.scalars = set()
+        # current batch, values by column
+        self.batch_times = []
+        self.batch_columns = []
+
+    def update(self, reader, uid, value):
+        """Join a point, walk_result function, return row or None"""
+        if not isinstance(value, Point):
+            self._set_scalar(reader, uid, value)
+            return None
+        column = self.columns.get(uid)
+        if column is None:
+            column = self._add_column(reader, uid)
+        if self.times[column] is None:
+            self.missing -= 1
+        self.values[column] = value.i
+        self.times[column] = value.time
+        values = self._row_values(value.time)
+        if values is None:
+            return None
+        if self.on_row is not None:
+            self.on_row(value.time, values)
+        if self.on_batch is not None:
+            self.batch_times.append(value.time)
+            for i, column_values in enumerate(self.batch_columns):
+                column_values.append(values[i])
+            if len(self.batch_times) >= self.batch_size:
+                self.flush()
+        return value.time, values
+
+    def join(self, stream):
+        """Generator of rows joined from a Stream"""
+        for uid, value in stream:
+            row = self.update(stream.reader, uid, value)
+            if row is not None:
+                yield row
+
+    def flush(self):
+        """Give current batch to on_batch, if not empty"""
+        if not self.batch_times:
+            return
+        times, columns = self.batch_times, self.batch_columns
+        self.batch_times = []
+        self.batch_columns = [[] for _ in columns]
+        self.on_batch(times, columns)
+
+    def _add_column(self, reader, uid):
+        # column of a new timeserie, all columns of its array are added
+        pos, is_in_array = reader._get_array_where(uid)
+        column = pos.pos if is_in_array else len(self.values)
+        size = column + 1
+        if is_in_array:
+            size = max(size, reader._get_array_size_by_id(pos.uid))
+        if size > len(self.values):
+            self.missing += size - len(self.values)
+            for _ in range(size - len(self.values)):
+                self.values.append(None)
+                self.times.append(None)
+                # earlier rows had no value for new columns
+                self.batch_columns.append([self._missing_value()] * len(self.batch_times))
+        self.columns[uid] = column
+        return column
+
+    def _set_scalar(self, reader, uid, value):
+        # scalar value in an array, like a number between two timeseries
+        _, is_in_array = reader._get_array_where(uid)
+        if not is_in_array or reader._get_array_size_by_id(uid) is not None:
+            return
+        column = self.columns.get(uid)
+        if column is None:
+            column = self._add_column(reader, uid)
+        if self.times[column] is None:
+            self.missing -= 1
+        self.scalars.add(column)
+        self.values[column] = value
+        # not None once received, scalar columns are never stale
+        self.times[column] = value
+
+    def _missing_value(self):
+        # value of a missing or stale column
+        if self.fill == FILL_NAN:
+            return float('nan')
+        return None
+
+    def _row_values(self, time):
+        # last values of every column at time, None if row is dropped
+        if self.missing == 0 and self.tolerance is None:
+            return list(self.values)
+        values = list(self.values)
+        tolerance = self.tolerance_ns if isinstance(time, int) else self.tolerance
+        for i, last in enumerate(self.times):
+            if i in self.scalars:
+                continue
+            if last is not None and (tolerance is None or time - last <= tolerance):
+                continue
+            if last is not None and self.fill == FILL_LAST:
+                continue
+            if self.fill == FILL_DROP:
+                return None
+            values[i] = self._missing_value()
+        return values
+
+
+class Bar():
+    """OHLC bar of a time bucket, with count, volume and VWAP"""
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'count', 'volume', 'amount')
+
+    def __init__(self, start, price):
+        self.start = start
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.count = 0
+        self.volume = 0
+        # sum of price * volume
+        self.amount = 0.0
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(slots_dict(self))
+
+    def add(self, price, volume=None):
+        """Add a trade, volume is optional"""
+        if price > self.high:
+            self.high = price
+        if price < self.low:
+            self.low = price
+        self.close = price
+        self.count += 1
+        if volume is not None:
+            self.volume += volume
+            self.amount += price * volume
+
+    def get_vwap(self):
+        """Volume weighted average price, None without volume"""
+        if self.volume == 0:
+            return None
+        return self.amount / self.volume
+
+
+class Resampler():
+    """Streaming OHLC bars of timeserie points, by time buckets of period
+
+    Buckets are aligned on origin, nano seconds since epoch. A bar is
+    completed by the first point of a later bucket of its timeserie, so
+    only an open bar per timeserie is kept. Point values are prices, or
+    (price, volume) pairs for volume and VWAP. Points older than the open
+    bar are counted in late and skipped. Use TIME_NANO times for exact
+    buckets, datetime being rounded to microseconds.
+    """
+
+    def __init__(self, period, origin=0, on_bar=None):
+        self.period = nano_duration(period)
+        self.origin = origin
+        # called with (uid, bar) for each completed bar
+        self.on_bar = on_bar
+        # open bar by uid
+        self.bars = {}
+        self.late = 0
+
+    def update(self, _, uid, value):
+        """Add a point, walk_result function, return completed Bar or None"""
+        if not isinstance(value, Point):
+            return None
+        time = time_nano(value.time)
+        price, volume = value.i, None
+        if isinstance(price, tuple):
+            price, volume = price
+        start = time - (time - self.origin) % self.period
+        bar = self.bars.get(uid)
+        done = None
+        if bar is not None and start != bar.start:
+            if start < bar.start:
+                self.late += 1
+                return None
+            done = bar
+            bar = None
+            if self.on_bar is not None:
+                self.on_bar(uid, done)
+        if bar is None:
+            bar = Bar(NanoTime(start), price)
+            self.bars[uid] = bar
+        bar.add(price, volume)
+        return done
+
+    def resample(self, stream):
+        """Generator of (uid, bar) completed bars of a Stream, open ones at the end"""
+        for uid, value in stream:
+            bar = self.update(stream.reader, uid, value)
+            if bar is not None:
+                yield uid, bar
+        for uid, bar in self.flush():
+            yield uid, bar
+
+    def flush(self):
+        """Complete open bars, return them as (uid, bar) list"""
+        bars = list(self.bars.items())
+        self.bars = {}
+        if self.on_bar is not None:
+            for uid, bar in bars:
+                self.on_bar(uid, bar)
+        return bars
+
+
+class Downsampler():
+    """Fixed size plot-ready sample of timeseries, in one pass
+
+    Min and max points of a fixed number of time buckets are kept per
+    timeserie. Buckets span start to stop if known, else they are merged
+    two by two each time a point falls after the last one, so live streams
+    use bounded memory. With LTTB, points are selected among min and max
+    of LTTB_CANDIDATES times more buckets.
+    """
+
+    def __init__(self, points=DOWNSAMPLE_POINTS, method=MINMAX, start=None, stop=None):
+        if method not in (MINMAX, LTTB):
+            raise LispTickException("Unknown downsampling method " + str(method))
+        self.points = points
+        self.method = method
+        self.start = None if start is None else time_nano(start)
+        self.stop = None if stop is None else time_nano(stop)
+        # buckets by timeserie uid
+        self.samples = {}
+
+    def update(self, _, uid, value):
+        """Add a point, walk_result function"""
+        if not isinstance(value, Point) or not isinstance(value.i, (int, float)):
+            return
+        buckets = self.samples.get(uid)
+        if buckets is None:
+            # first and last points are kept beside buckets
+            size = max(1, (self.points - 2) // 2)
+            if self.method == LTTB:
+                size = self.points * LTTB_CANDIDATES // 2
+            buckets = MinMaxBuckets(size, self.start, self.stop)
+            self.samples[uid] = buckets
+        buckets.add(time_nano(value.time), value)
+
+    def get_points(self, uid=None):
+        """Sampled points of timeserie uid, of the only one if None"""
+        if uid is None:
+            if len(self.samples) != 1:
+                raise LispTickException("uid is needed to sample many timeseries")
+            uid = list(self.samples)[0]
+        points = self.samples[uid].get_points()
+        if self.method == LTTB:
+            return lttb(points, self.points)
+        return [point for _, point in points]
+
+
+class MinMaxBuckets():
+    """Min and max points of size time buckets, first and last points"""
+
+    def __init__(self, size, start=None, stop=None):
+        self.size = size
+        # [min time, min point, max time, max point] by bucket
+        self.buckets = [None] * size
+        self.origin = start
+        self.width = 1
+        if start is not None and stop is not None:
+            self.width = max(1, -(-(stop - start) // size))
+        self.first = None
+        self.last = None
+
+    def add(self, nano, point):
+        """Add point at nano seconds since epoch"""
+        if self.origin is None:
+            self.origin = nano
+        if self.first is None:
+            self.first = (nano, point)
+        self.last = (nano, point)
+        index = max(0, (nano - self.origin) // self.width)
+        while index >= self.size:
+            self._merge()
+            index = (nano - self.origin) // self.width
+        bucket = self.buckets[index]
+        if bucket is None:
+            self.buckets[index] = [nano, point, nano, point]
+            return
+        if point.i < bucket[1].i:
+            bucket[0] = nano
+            bucket[1] = point
+        if point.i > bucket[3].i:
+            bucket[2] = nano
+            bucket[3] = point
+
+    def get_points(self):
+        """(nano, point) list of first, min and max by bucket, and last points"""
+        res = []
+        if self.first is not None:
+            res.append(self.first)
+        for bucket in self.buckets:
+            if bucket is None:
+                continue
+            low, high = (bucket[0], bucket[1]), (bucket[2], bucket[3])
+            if high[0] < low[0]:
+                low, high = high, low
+            for item in (low, high):
+                if item[1] is not res[-1][1]:
+                    res.append(item)
+        if self.last is not None and self.last[1] is not res[-1][1]:
+            res.append(self.last)
+        return res
+
+    def _merge(self):
+        # twice wider buckets
+        buckets = [None] * self.size
+        for i in range(0, self.size, 2):
+            left = self.buckets[i]
+            right = self.buckets[i + 1] if i + 1 < self.size else None
+            if left is None or right is None:
+                buckets[i // 2] = left if right is None else right
+                continue
+            merged = list(left)
+            if right[1].i < merged[1].i:
+                merged[0:2] = right[0:2]
+            if right[3].i > merged[3].i:
+                merged[2:4] = right[2:4]
+            buckets[i // 2] = merged
+        self.buckets = buckets
+        self.width *= 2
+
+
+def lttb(points, threshold):
+    """Largest Triangle Three Buckets selection of threshold points
+
+    points is a time ordered list of (nano, point), selected points are
+    returned.
+    """
+    if threshold >= len(points):
+        return [point for _, point in points]
+    if threshold < 3:
+        return [points[0][1], points[-1][1]][:threshold]
+    res = [points[0][1]]
+    every = (len(points) - 2) / (threshold - 2)
+    selected = points[0]
+    for i in range(threshold - 2):
+        # average of next bucket
+        start = int((i + 1) * every) + 1
+        end = min(int((i + 2) * every) + 1, len(points))
+        avg_x = sum(nano for nano, _ in points[start:end]) / (end - start)
+        avg_y = sum(point.i for _, point in points[start:end]) / (end - start)
+        # point of current bucket making largest triangle
+        best = None
+        best_area = -1.0
+        x_a, y_a = selected[0], selected[1].i
+        for item in points[int(i * every) + 1:int((i + 1) * every) + 1]:
+            area = abs((x_a - avg_x) * (item[1].i - y_a) - (x_a - item[0]) * (avg_y - y_a))
+            if area > best_area:
+                best_area = area
+                best = item
+        selected = best
+        res.append(best[1])
+    res.append(points[-1][1])
+    return res
+
+
+def ohlc_columns(times, values, period, volumes=None, origin=0):
+    """OHLC bars of columnar timeserie, as get_columns returns
+
+    Return a dict of numpy arrays: bucket start time, open, high, low,
+    close, count, and volume and vwap when volumes are given.
+    """
+    if numpy is None:
+        raise LispTickException("numpy is needed for columnar results")
+    period = nano_duration(period)
+    values = numpy.asarray(values)
+    buckets = (numpy.asarray(times).view('int64') - origin) // period
+    # first point of each bucket, times being sorted
+    starts = numpy.flatnonzero(numpy.diff(buckets, prepend=buckets[:1] - 1))
+    ends = numpy.append(starts[1:], len(values))[:len(starts)]
+    res = {
+        'time': (buckets[starts] * period + origin).view('datetime64[ns]'),
+        'open': values[starts],
+        'high': numpy.maximum.reduceat(values, starts),
+        'low': numpy.minimum.reduceat(values, starts),
+        'close': values[ends - 1],
+        'count': ends - starts,
+    }
+    if volumes is not None:
+        volumes = numpy.asarray(volumes)
+        res['volume'] = numpy.add.reduceat(volumes, starts)
+        amount = numpy.add.reduceat(values * volumes, starts)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            res['vwap'] = amount / res['volume']
+    return res
+
+
+def time_nano(time):
+    """Nano seconds since epoch of a decoded time, datetime or int"""
+    if isinstance(time, int):
+        return time
+    return int(round(time.timestamp() * 1000000)) * 1000
+
+
+def nano_duration(duration):
+    """Nano seconds of a timedelta, or of an int already in nano seconds"""
+    if isinstance(duration, datetime.timedelta):
+        return duration // datetime.timedelta(microseconds=1) * 1000
+    return int(duration)
+
+
+class LiveStats():
+    """Reconnections and replayed points of a LiveStream, times in seconds"""
+
+    def __init__(self):
+        self.stalls = 0
+        self.disconnects = 0
+        self.connect_failures = 0
+        self.reconnects = 0
+        # from failure detection to first element of resumed stream
+        self.reconnect_latency = None
+        self.max_reconnect_latency = None
+        # points received again after a resume and skipped
+        self.duplicates = 0
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+
+class LiveStream():
+    """Iterator of (uid, value) of a live request, resumed after failures
+
+    Each connection has a socket timeout of deadline seconds, so a server
+    sending neither points nor heartbeats is detected as stalled. After a
+    stall or a lost connection, request is sent again with {start} set to
+    last received point time, rounded down to the second, with a backoff
+    delay between failed attempts. Points already received are skipped,
+    so timeseries go on without duplicates nor gaps.
+    """
+
+    def __init__(self, conn, template, start, deadline=LIVE_DEADLINE, retries=-1,
+                 delay=RECONNECT_DELAY, max_delay=RECONNECT_MAX_DELAY):
+        self.conn = conn
+        self.template = template
+        self.start = int(start.timestamp())
+        self.deadline = deadline
+        self.retries = retries
+        self.delay = delay
+        self.max_delay = max_delay
+        self.stats = LiveStats()
+        self.stream = None
+        # consecutive failures and time of first one
+        self.failures = 0
+        self.failed_at = None
+        # (nano seconds, points at that time) of last point by uid
+        self.last = {}
+        # same for points to skip by uid, while a resumed request replays
+        self.replay = {}
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self.closed:
+            if self.stream is None:
+                self._open()
+            try:
+                uid, value = next(self.stream)
+            except StopIteration:
+                if self.stream.reader.complete or self.stream.reader.stopped:
+                    self.close()
+                    raise
+                # connection closed before end of result
+                self._failed(False)
+                continue
+            except OSError as err:
+                if self.stream.reader.stopped:
+                    # stopped and shut down by a Demux
+                    self.close()
+                    raise StopIteration
+                self._failed(isinstance(err, socket.timeout))
+                continue
+            except LispTickException:
+                if self.stream.reader.error != "":
+                    # error sent by server, not retried
+                    self.close()
+                    raise
+                self._failed(False)
+                continue
+            if self.failed_at is not None:
+                self._resumed()
+            if isinstance(value, Point) and self._is_duplicate(uid, value):
+                self.stats.duplicates += 1
+                continue
+            return uid, value
+        raise StopIteration
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def reader(self):
+        """LisptickReader of current connection, as used by AsOfJoin or Demux"""
+        return None if self.stream is None else self.stream.reader
+
+    @property
+    def con(self):
+        """Socket of current connection"""
+        return None if self.stream is None else self.stream.con
+
+    def close(self):
+        """Stop receiving, close socket"""
+        self.closed = True
+        if self.stream is not None:
+            self.stream.close()
+
+    def get_request(self):
+        """Request resuming from last received point time"""
+        start = self.start
+        if self.last:
+            start = min(nano for nano, _ in self.last.values()) // 1000000000
+        return self.template.replace("{start}", lisptick_time(start))
+
+    def _open(self):
+        # connect and send request, retried with backoff
+        while True:
+            if self.failures > 0:
+                if self.retries > -1 and self.failures > self.retries:
+                    self.close()
+                    raise LispTickException(
+                        "Live stream lost after %d reconnections" % self.retries)
+                time.sleep(min(self.delay * 2 ** (self.failures - 1), self.max_delay))
+            try:
+                sock = self.conn._connect()
+            except OSError:
+                self.stats.connect_failures += 1
+                self.failures += 1
+                continue
+            try:
+                sock.settimeout(self.deadline)
+                send_message(sock, self.get_request())
+            except OSError:
+                self.conn._release(sock, None, False)
+                self.stats.connect_failures += 1
+                self.failures += 1
+                continue
+            except BaseException:
+                self.conn._release(sock, None, False)
+                raise
+            self.stream = Stream(sock, self.conn._release, self.conn.time_decoder,
+                                 hooks=self.conn.hooks)
+            if self.failed_at is not None:
+                self.stats.reconnects += 1
+                self.replay = dict(self.last)
+            return
+
+    def _failed(self, stalled):
+        # stream stalled or lost, reopened on next element
+        if stalled:
+            self.stats.stalls += 1
+        else:
+            self.stats.disconnects += 1
+        self.stream.close()
+        self.stream = None
+        self.failures += 1
+        if self.failed_at is None:
+            self.failed_at = time.perf_counter()
+
+    def _resumed(self):
+        # first element received after a failure
+        latency = time.perf_counter() - self.failed_at
+        self.stats.reconnect_latency = latency
+        if self.stats.max_reconnect_latency is None or latency > self.stats.max_reconnect_latency:
+            self.stats.max_reconnect_latency = latency
+        self.failures = 0
+        self.failed_at = None
+
+    def _is_duplicate(self, uid, point):
+        # point already received before resume, else remember its time
+        nano = time_nano(point.time)
+        replay = self.replay.get(uid)
+        if replay is not None:
+            if nano < replay[0]:
+                return True
+            if nano == replay[0] and replay[1] > 0:
+                self.replay[uid] = (nano, replay[1] - 1)
+                return True
+            del self.replay[uid]
+        last = self.last.get(uid)
+        if last is not None and last[0] == nano:
+            self.last[uid] = (nano, last[1] + 1)
+        else:
+            self.last[uid] = (nano, 1)
+        return False
+
+
+class RingBuffer():
+    """Bytes received by a thread and read by another, in a fixed size buffer
+
+    Reader side is socket like, to be read by a LisptickReader.
+    """
+
+    def __init__(self, size=RING_SIZE):
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        # total number of bytes read and received
+        self.head = 0
+        self.tail = 0
+        self.cond = threading.Condition()
+        self.eof = False
+        self.max_depth = 0
+        # number of times receiver waited for free space
+        self.waits = 0
+
+    def depth(self):
+        """Number of received bytes not yet read"""
+        return self.tail - self.head
+
+    def receive(self, con):
+        """Receive once from con into free space, 0 at the end"""
+        size = len(self.buf)
+        with self.cond:
+            while self.tail - self.head == size and not self.eof:
+                self.waits += 1
+                self.cond.wait()
+            if self.eof:
+                return 0
+            start = self.tail % size
+            end = min(size, start + size - (self.tail - self.head))
+        # free space is not read until tail moves
+        received = con.recv_into(self.view[start:end])
+        with self.cond:
+            if received == 0:
+                self.eof = True
+            self.tail += received
+            if self.tail - self.head > self.max_depth:
+                self.max_depth = self.tail - self.head
+            self.cond.notify_all()
+        return received
+
+    def recv_into(self, buffer):
+        """Copy received bytes into buffer, 0 at the end"""
+        size = len(self.buf)
+        with self.cond:
+            while self.tail == self.head and not self.eof:
+                self.cond.wait()
+            start = self.head % size
+            count = min(len(buffer), self.tail - self.head, size - start)
+        buffer[:count] = self.view[start:start + count]
+        with self.cond:
+            self.head += count
+            self.cond.notify_all()
+        return count
+
+    def close(self):
+        """No more bytes, reader gets remaining ones then end"""
+        with self.cond:
+            self.eof = True
+            self.cond.notify_all()
+
+
+class PipelineStats():
+    """Queue depths and lag of a Pipeline"""
+
+    def __init__(self, pipeline):
+        ring = pipeline.ring
+        self.received = ring.tail
+        self.ring_depth = ring.depth()
+        self.ring_max_depth = ring.max_depth
+        self.receiver_waits = ring.waits
+        # in batches of decoded elements
+        self.queue_depth = len(pipeline.queue.points)
+        self.queue_max_depth = pipeline.queue.max_depth
+        # seconds from last consumed point time to now, for live results
+        self.lag = None
+        if pipeline.last_time is not None:
+            self.lag = time.time() - time_nano(pipeline.last_time) / 1e9
+
+    def __str__(self):
+        return str(self.__class__) + ": " + str(self.__dict__)
+
+
+class Pipeline():
+    """Iterator of (uid, value) received, decoded and consumed by three threads
+
+    A receiver thread drains socket into a RingBuffer, a decoder thread
+    decodes it into a bounded Route queue of batches, iterated by consumer.
+    So socket draining never waits for user code until ring buffer is full.
+    A batch is queued when full or when no more data is received yet.
+    Socket is closed at the end of the result, on error, or by close.
+    """
+
+    def __init__(self, init_con, release=None, time_decoder=None,
+                 ring_size=RING_SIZE, queue_size=PIPELINE_QUEUE_SIZE):
+        self.con = init_con
+        # called with (socket, None) instead of closing socket
+        self.release = release
+        self.ring = RingBuffer(ring_size)
+        self.reader = LisptickReader(self.ring, time_decoder=time_decoder)
+        self.queue = Route(None, maxsize=queue_size)
+        # current batch and position in it
+        self.batch = []
+        self.pos = 0
+        self.error = None
+        self.stopped = False
+        self.closed = False
+        # time of last consumed point
+        self.last_time = None
+        self.receiver = threading.Thread(target=self._receive, daemon=True)
+        self.decoder = threading.Thread(target=self._decode, daemon=True)
+        self.receiver.start()
+        self.decoder.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.pos == len(self.batch):
+            item = self.queue.get()
+            if item is None:
+                self.close()
+                if self.error is not None:
+                    raise self.error
+                raise StopIteration
+            self.batch = item[1]
+            self.pos = 0
+        item = self.batch[self.pos]
+        self.pos += 1
+        if isinstance(item[1], Point):
+            self.last_time = item[1].time
+        return item
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def get_stats(self):
+        """Current PipelineStats"""
+        return PipelineStats(self)
+
+    def close(self):
+        """Stop receiving and decoding, close socket"""
+        if self.closed:
+            return
+        self.closed = True
+        self.stopped = True
+        self.reader.stop()
+        self._shutdown()
+        self.ring.close()
+        self.queue.close()
+        for thread in (self.receiver, self.decoder):
+            if thread is not threading.current_thread():
+                thread.join()
+        if self.release is None:
+            self.con.close()
+        else:
+            # socket is shut down, never reused
+            self.release(self.con, None)
+
+    def _shutdown(self):
+        # wake up receiver thread waiting for data
+        try:
+            self.con.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _receive(self):
+        # receiver thread, until end of connection or of result
+        try:
+            while self.ring.receive(self.con) > 0:
+                pass
+        except OSError:
+            # decoder ends with a closed connection error
+            pass
+        finally:
+            self.ring.close()
+
+    def _decode(self):
+        # decoder thread, queue decoded elements
+        recv = self.reader.recv_buffer
+        batch = []
+        try:
+            for element in self.reader.iter_result():
+                batch.append(element)
+                # next element would wait for data
+                if len(batch) >= PIPELINE_BATCH or recv.end == recv.start:
+                    self.queue.put(None, batch)
+                    batch = []
+            if batch:
+                self.queue.put(None, batch)
+            if self.reader.error != "":
+                self.error = LispTickException(self.reader.error)
+        except Exception as err:
+            if not self.stopped:
+                self.error = err
+        finally:
+            self.queue.close()
+            # result is read, connection may stay open
+            self._shutdown()
+            self.ring.close()
+
+
+class Recorder():
+    """Socket proxy writing received bytes to a file"""
+
+    def __init__(self, init_con, out):
+        self.con = init_con
+        self.out = out
+
+    def recv_into(self, buffer):
+        """Receive into buffer and record received bytes"""
+        received = self.con.recv_into(buffer)
+        self.out.write(buffer[:received])
+        return received
+
+    def close(self):
+        """Close proxied socket"""
+        self.con.close()
+
+
+class Replay():
+    """Result recorded by Socket.record, read from a memory mapped file
+
+    By default result is replayed at full speed. With speed, walk_result
+    and stream wait between points according to their times, speed 1.0
+    being real time, 2.0 twice faster.
+    """
+
+    def __init__(self, path, speed=None, time_decoder=None):
+        self.path = path
+        self.speed = speed
+        self.time_decoder = time_decoder
+
+    def get_result(self, limit=-1, compact=False, partial=False):
+        """Recorded result"""
+        return self._read(lambda reader: reader.get_result(limit, compact, partial))
+
+    def get_columns(self, limit=-1, partial=False):
+        """Recorded result with numpy timeseries"""
+        return self._read(lambda reader: reader.get_columns(limit, partial))
+
+    def walk_arrow(self, func, batch_size=ARROW_BATCH_SIZE):
+        """Call func on pyarrow record batches of recorded result"""
+        err_msg = self._read(lambda reader: reader.walk_arrow(func, batch_size))
+        if err_msg != "":
+            raise LispTickException(err_msg)
+
+    def spill(self, directory, chunk_points=SPILL_CHUNK_POINTS):
+        """Recorded result with timeseries written to directory"""
+        return self._read(lambda reader: reader.spill(directory, chunk_points))
+
+    def walk_result(self, func, limit=-1):
+        """Call func on each part of recorded result"""
+        def walk(reader):
+            for uid, value in paced(reader.iter_result(limit), self.speed):
+                func(reader, uid, value)
+            return reader.error
+
+        err_msg = self._read(walk)
+        if err_msg != "":
+            raise LispTickException(err_msg)
+
+    def stream(self, limit=-1):
+        """Stream of (uid, value) of recorded result"""
+        data = open_mmap(self.path)
+        stream = Stream(data, time_decoder=self.time_decoder, limit=limit)
+        if self.speed is not None:
+            stream.walker = paced(stream.walker, self.speed)
+        return stream
+
+    def _read(self, read):
+        """read(reader) of a reader of memory mapped recorded result"""
+        data = open_mmap(self.path)
+        try:
+            return read(LisptickReader(data, time_decoder=self.time_decoder))
+        finally:
+            close_mmap(data)
+
+
+class ResultCache():
+    """On disk cache of raw results of immutable requests
+
+    Results are recorded in directory, keyed by server and normalized
+    request text, and replayed from memory mapped files on hits. Least
+    recently used results are removed above max_size bytes, results older
+    than ttl seconds are fetched again. Requests matching an uncacheable
+    regular expression, by default using (now), are never cached.
+    """
+
+    def __init__(self, directory, max_size=CACHE_MAX_SIZE, ttl=None,
+                 uncacheable=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        if uncacheable is None:
+            uncacheable = UNCACHEABLE
+        self.uncacheable = [re.compile(pattern) for pattern in uncacheable]
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # held while evicting and while opening a cached result
+        self.evict_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def is_cacheable(self, request):
+        """False if request matches an uncacheable pattern"""
+        for pattern in self.uncacheable:
+            if pattern.search(request):
+                return False
+        return True
+
+    def key(self, host, port, request):
+        """Cache key of request sent to host:port"""
+        text = "%s:%s\n%s" % (host, port, normalize_request(request))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, host, port, request):
+        """Path of cached raw result, None if missing or expired"""
+        path = self._path(self.key(host, port, request))
+        try:
+            stat = os.stat(path)
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+        now = time.time()
+        if self.ttl is not None and now - stat.st_mtime > self.ttl:
+            remove_file(path)
+            with self.lock:
+                self.misses += 1
+            return None
+        # access time is last use, modification time is record time
+        os.utime(path, (now, stat.st_mtime))
+        with self.lock:
+            self.hits += 1
+        return path
+
+    def open(self, host, port, request):
+        """Memory mapped cached raw result, None if missing or expired
+
+        Result is opened before any eviction can remove it, a mapping
+        staying valid once its file is removed.
+        """
+        with self.evict_lock:
+            path = self.get(host, port, request)
+            if path is None:
+                return None
+            try:
+                return open_mmap(path)
+            except OSError:
+                # removed by another process
+                return None
+
+    def put(self, host, port, request, temp):
+        """Move recorded raw result temp into cache, return its path
+
+        Result put is never evicted by this call, even above max_size.
+        """
+        path = self._path(self.key(host, port, request))
+        os.replace(temp, path)
+        self.evict(keep=path)
+        return path
+
+    def temp_path(self):
+        """Unique path to record a result before put"""
+        import tempfile
+        handle, path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        os.close(handle)
+        return path
+
+    def evict(self, keep=None):
+        """Remove least recently used results above max_size, except keep"""
+        with self.evict_lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith(".bin"):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                total += stat.st_size
+                if path != keep:
+                    entries.append((stat.st_atime, stat.st_size, path))
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_size:
+                    break
+                remove_file(path)
+                total -= size
+
+    def clear(self):
+        """Remove all cached results"""
+        for name in os.listdir(self.directory):
+            if name.endswith(".bin"):
+                remove_file(os.path.join(self.directory, name))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".bin")
+
+
+def normalize_request(request):
+    """Request without comments and with single spaces, strings kept as is"""
+    res = []
+    in_string = False
+    in_comment = False
+    space = False
+    i = 0
+    while i < len(request):
+        char = request[i]
+        if in_string:
+            res.append(char)
+            if char == "\\" and i + 1 < len(request):
+                i += 1
+                res.append(request[i])
+            elif char == '"':
+                in_string = False
+        elif in_comment:
+            if char == "\n":
+                in_comment = False
+                space = True
+        elif char == ";":
+            in_comment = True
+        elif char.isspace():
+            space = True
+        else:
+            if space and len(res) > 0:
+                res.append(" ")
+            space = False
+            res.append(char)
+            if char == '"':
+                in_string = True
+        i += 1
+    return "".join(res)
+
+
+def remove_file(path):
+    """Remove path, already removed is fine"""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def open_mmap(path):
+    """Read only memory mapped file, empty bytes for an empty file"""
+    with open(path, "rb") as data:
+        if os.fstat(data.fileno()).st_size == 0:
+            return b''
+        import mmap
+        # mapping stays valid once file is closed
+        return mmap.mmap(data.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def is_mmap(data):
+    """True if data is a memory mapped file"""
+    # mmap is imported by open_mmap, nothing is mapped before
+    mmap = sys.modules.get("mmap")
+    return mmap is not None and isinstance(data, mmap.mmap)
+
+
+def close_mmap(data):
+    """Close data if it is a memory mapped file"""
+    if is_mmap(data):
+        try:
+            data.close()
+        except BufferError:
+            # still used by a numpy array, closed when garbage collected
+            pass
+
+
+def paced(walker, speed):
+    """Generator of walker (uid, value), points delayed by their times / speed"""
+    if speed is None:
+        for element in walker:
+            yield element
+        return
+    first = None
+    for uid, value in walker:
+        if isinstance(value, Point) and isinstance(value.time, (datetime.datetime, int)):
+            if isinstance(value.time, int):
+                epoch = value.time / 1e9
+            else:
+                epoch = value.time.timestamp()
+            if first is None:
+                first = epoch
+                start = time.monotonic()
+            delay = (epoch - first) / speed - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+        yield uid, value
+
+
+#dec64 float factor
+factors = [1.0]*129
+for e in range (0, 128):
+    factors[e] = pow(10.0, e)
+
+if numpy is not None:
+    # head is type byte and uid as a single LittleEndian UInt32
+    point_record = numpy.dtype({
+        'names': ['head', 'value', 'time'],
+        'formats': ['<u4', '<i8', '<i8'],
+        'offsets': [0, 4, 12],
+        'itemsize': POINT_RECORD_SIZE})
+    element_record = numpy.dtype({
+        'names': ['head', 'value'],
+        'formats': ['<u4', '<i8'],
+        'offsets': [0, 4],
+        'itemsize': ELEMENT_RECORD_SIZE})
+    np_factors = numpy.array(factors)
+
+
+def dec64(d64):
+    """Dec64 special encoding see https://www.crockford.com/dec64.html"""
+    if (d64 % 256) > 127:
+        return (d64 >> 8) / factors[256 - (d64 % 256)]
+    return (d64 >> 8) * factors[d64 % 256]
+
 
-    def get_year(self):
-        """Number of years duration part"""
-        return self.year
+# Timeserie point codec and value conversion by type byte
+POINT_CODECS = {
+    TINT[0]: (INT_POINT_STRUCT, None),
+    TFLOAT[0]: (FLOAT_POINT_STRUCT, None),
+    TBOOL[0]: (INT_POINT_STRUCT, bool),
+    TDEC64[0]: (INT_POINT_STRUCT, dec64),
+}
 
-    def get_month(self):
-        """Number of month duration part"""
-        return self.month
 
-    def get_timedelta(self):
-        """micro seconds and days duration part as a timedelta"""
-        return self.timedelta
+class StatsHooks():
+    """Instrumentation callbacks, override some of them to export ReaderStats
 
+    Called from the thread reading the result, a hook must be quick.
+    """
 
-class Point():
-    """A point is a value at a time"""
+    def on_first_byte(self, stats):
+        """First bytes of result received"""
 
-    def __init__(self, init_time, init_value):
-        self.time = init_time
-        self.i = init_value
+    def on_first_point(self, stats):
+        """First timeserie point decoded"""
 
-    def __str__(self):
-        return str(self.time) + " " + str(self.i)
+    def on_heartbeat(self, stats, interval):
+        """HeartBeat received interval seconds after previous one"""
 
-    def __len__(self):
-        return 2
+    def on_end(self, stats):
+        """Result ended, completely read or not"""
 
 
-class HeartBeat():
-    """An HeartBeat is an information value that can be forgotten"""
+class ReaderStats():
+    """Received bytes, decoded elements and times of a result, in seconds
 
-    def __init__(self, init_value):
-        self.value = init_value
+    Times to first byte and first point are measured from instrument call,
+    just after request is sent. decode_time excludes recv_time spent waiting
+    for data, callback_time is spent by consumer between two elements.
+    cached is True for a result replayed from a ResultCache.
+    """
+
+    def __init__(self, hooks=None, cached=False):
+        self.hooks = hooks if hooks is not None else StatsHooks()
+        self.cached = cached
+        self.start = time.perf_counter()
+        self.received = 0
+        self.recv_calls = 0
+        self.recv_time = 0.0
+        # decoded elements by type name, points of bulk runs included,
+        # array and timeserie headers not included
+        self.elements = collections.Counter()
+        # type name of last decoded element, counted once yielded, so a
+        # point whose time is not received is not counted
+        self.decoded = None
+        self.decode_time = 0.0
+        self.callback_time = 0.0
+        self.first_byte = None
+        self.first_point = None
+        self.heartbeats = 0
+        self.heartbeat_interval = None
+        self.heartbeat_max_interval = None
+        self.last_heartbeat = None
+        # seconds from start to end of result, None until then
+        self.elapsed = None
 
     def __str__(self):
-        return str(self.__class__) + ": " + str(self.__dict__)
+        res = dict(self.__dict__)
+        del res["hooks"]
+        del res["decoded"]
+        res["elements"] = dict(self.elements)
+        return str(self.__class__) + ": " + str(res)
 
-    def get_value(self):
-        """HeartBeat value"""
-        return self.value
+    def instrument(self, reader):
+        """Wrap recv and decoders of reader to count bytes and elements"""
+        recv = reader.recv_buffer
+        if recv.recv_into is not None:
+            recv.recv_into = self._counted_recv(recv.recv_into)
+        else:
+            # already received
+            self.received = recv.available()
+            self.first_byte = 0.0
+            self.hooks.on_first_byte(self)
+        # elements only, not values nested in them
+        for idt, decoder in enumerate(reader.decoders):
+            if decoder is not None:
+                reader.decoders[idt] = self._counted(TYPE_NAMES[idt], decoder)
+        reader._get_point = self._counted_point(reader._get_point)
+        reader._get_bulk_points = self._counted_bulk(reader, reader._get_bulk_points)
 
-class Tensor():
-    """Tensor  n-dimensional arrays"""
+    def iterate(self, walker):
+        """Generator of walker elements, timing decoding and consumer"""
+        clock = time.perf_counter
+        try:
+            while True:
+                start = clock()
+                waited = self.recv_time
+                try:
+                    element = next(walker)
+                except StopIteration:
+                    self.decode_time += clock() - start - (self.recv_time - waited)
+                    if self.decoded is not None:
+                        # end sentinel
+                        self.elements[self.decoded] += 1
+                    return
+                now = clock()
+                self.decode_time += now - start - (self.recv_time - waited)
+                self.elements[self.decoded] += 1
+                self.decoded = None
+                value = element[1]
+                if isinstance(value, Point):
+                    if self.first_point is None:
+                        self._on_first_point(now)
+                elif isinstance(value, HeartBeat):
+                    self._on_heartbeat(now)
+                yield element
+                self.callback_time += clock() - now
+        finally:
+            walker.close()
+            self.elapsed = clock() - self.start
+            self.hooks.on_end(self)
 
-    def __init__(self, shape, values=None):
-        self.shape = shape
-        if values is None:
-            values = [0] * self.get_size()
-        self.values = values
+    def _on_first_point(self, now):
+        self.first_point = now - self.start
+        self.hooks.on_first_point(self)
 
-    def __str__(self):
-        return str(self.__class__) + ": " + str(self.__dict__)
+    def _on_heartbeat(self, now):
+        interval = now - (self.start if self.last_heartbeat is None else self.last_heartbeat)
+        self.last_heartbeat = now
+        self.heartbeats += 1
+        self.heartbeat_interval = interval
+        if self.heartbeat_max_interval is None or interval > self.heartbeat_max_interval:
+            self.heartbeat_max_interval = interval
+        self.hooks.on_heartbeat(self, interval)
 
-    def get_size(self):
-        """tensor size in number of values"""
-        size = 1
-        for i in self.shape:
-            size *= i
-        return size
+    def _counted_recv(self, recv_into):
+        # recv_into counting calls, bytes and time
+        clock = time.perf_counter
 
+        def counted(buffer):
+            start = clock()
+            received = recv_into(buffer)
+            now = clock()
+            self.recv_time += now - start
+            self.recv_calls += 1
+            self.received += received
+            if self.first_byte is None and received > 0:
+                self.first_byte = now - self.start
+                self.hooks.on_first_byte(self)
+            return received
 
-class Socket():
-    """Request LispTick by socket"""
+        return counted
 
-    def __init__(self, host, port):
-        self.__host = host
-        self.__port = port
+    def _counted(self, name, decoder):
+        # decoder recording type of decoded element
+        def counted():
+            res = decoder()
+            self.decoded = name
+            return res
 
-    def get_result(self, request):
-        """Send resquest to server and return result"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((self.__host, self.__port))
+        return counted
 
-        # Send request
-        send_message(sock, request)
-        res = LisptickReader(sock).get_result(-1)
+    def _counted_point(self, get_point):
+        # fast path point decoder recording type of decoded point
+        def counted(recv):
+            idt = recv.buf[recv.start]
+            res = get_point(recv)
+            if res is not None:
+                self.decoded = TYPE_NAMES[idt]
+            return res
 
-        sock.close()
-        return res
+        return counted
 
-    def walk_result(self, request, func):
-        """Call func on each part of result"""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.connect((self.__host, self.__port))
+    def _counted_bulk(self, reader, get_bulk_points):
+        # bulk decoder counting points of decoded runs
+        elements = self.elements
 
-        # Send request
-        send_message(sock, request)
-        err_msg = LisptickReader(sock).walk_result(func)
+        def counted():
+            recv = reader.recv_buffer
+            start = recv.start
+            if not get_bulk_points():
+                return False
+            if self.first_point is None:
+                self._on_first_point(time.perf_counter())
+            elements[TYPE_NAMES[recv.buf[start]]] += (recv.start - start) // POINT_RECORD_SIZE
+            return True
 
-        sock.close()
-        if err_msg != "":
-            raise LispTickException(err_msg)
+        return counted
 
-#dec64 float factor
-factors = [1.0]*129
-for e in range (0, 128):
-    factors[e] = pow(10.0, e)
 
 class ReaderContext():
     """internaly used by get_result to read full result"""
@@ -185,9 +3076,13 @@ class ReaderContext():
         self.size_limit = limit
 
     def update_limit_and_check(self):
-        """increase limit and check if max is reached"""
+        """increase limit and check if max is reached
+
+        Reached on the first point over the limit, a result of exactly
+        size_limit points is complete.
+        """
         self.limit += 1
-        if self.size_limit > -1 & self.limit >= self.size_limit:
+        if self.size_limit > -1 and self.limit > self.size_limit:
             self.limit_reached = True
         return self.limit_reached
 
@@ -208,93 +3103,402 @@ class ReaderContext():
         self.arrays[uid] = array
 
 
+class RecvBuffer():
+    """Reusable receive buffer serving fixed size reads from large chunks"""
+
+    def __init__(self, init_con, size=BUFFER_SIZE):
+        self.con = init_con
+        # socket recv_into or file readinto
+        self.recv_into = getattr(init_con, "recv_into", None)
+        if self.recv_into is None:
+            self.recv_into = getattr(init_con, "readinto", None)
+        if self.recv_into is None and hasattr(init_con, "recv"):
+            # connection only having recv
+            self.recv_into = self._recv_into
+        self.buf = bytearray(size)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+
+    def _recv_into(self, view):
+        # recv_into of a connection only having recv, received bytes copied
+        data = self.con.recv(len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def available(self):
+        """Number of received bytes not yet read"""
+        return self.end - self.start
+
+    def fill(self, size):
+        """Ensure size bytes are buffered, False if connection ends before"""
+        remain = self.end - self.start
+        if remain >= size:
+            return True
+        if self.start + size > len(self.buf):
+            if size > len(self.buf):
+                # element bigger than buffer, grow it
+                self.buf = self.buf[self.start:self.end] + bytearray(size)
+                self.view = memoryview(self.buf)
+            else:
+                # move remaining bytes at buffer start
+                self.buf[0:remain] = self.buf[self.start:self.end]
+            self.start = 0
+            self.end = remain
+        while self.end - self.start < size:
+            received = self.recv_into(self.view[self.end:])
+            if received == 0:
+                return False
+            self.end += received
+        return True
+
+    def read(self, size):
+        """Read exactly size bytes"""
+        if self.end - self.start < size and not self.fill(size):
+            raise LispTickException("Connection closed before end of message")
+        res = bytes(self.view[self.start:self.start + size])
+        self.start += size
+        return res
+
+    def skip(self, size):
+        """Consume size bytes without reading them"""
+        if self.end - self.start < size and not self.fill(size):
+            raise LispTickException("Connection closed before end of message")
+        self.start += size
+
+    def read_head(self):
+        """Read type byte and uid as a UInt32, None if connection is closed"""
+        if self.end == self.start and not self.fill(1):
+            return None
+        return self.unpack(HEAD_STRUCT)[0]
+
+    def read_type(self):
+        """Read type byte of a serialized element, its unused uid skipped
+
+        None if connection is closed.
+        """
+        if self.end == self.start and not self.fill(1):
+            return None
+        return self.unpack(HEAD_STRUCT)[0] & 0xFF
+
+    def unpack(self, codec):
+        """Read and unpack codec.size bytes using a precompiled struct.Struct"""
+        size = codec.size
+        if self.end - self.start < size and not self.fill(size):
+            raise LispTickException("Connection closed before end of message")
+        res = codec.unpack_from(self.buf, self.start)
+        self.start += size
+        return res
+
+
+class NeedMoreData(Exception):
+    """Raised by AsyncRecvBuffer when an element is not fully received"""
+
+    def __init__(self, missing):
+        super(NeedMoreData, self).__init__(missing)
+        self.missing = missing
+
+
+class AsyncRecvBuffer(RecvBuffer):
+    """Receive buffer fed by asyncio, raise NeedMoreData instead of blocking"""
+
+    def __init__(self, size=BUFFER_SIZE):
+        super(AsyncRecvBuffer, self).__init__(None, size)
+        self.eof = False
+
+    def fill(self, size):
+        """Check size bytes are buffered, False at end of connection"""
+        if self.end - self.start >= size:
+            return True
+        if self.eof:
+            return False
+        raise NeedMoreData(size - (self.end - self.start))
+
+    def feed(self, data):
+        """Append received data"""
+        remain = self.end - self.start
+        if self.end + len(data) > len(self.buf):
+            if remain + len(data) > len(self.buf):
+                # grow buffer
+                self.buf = self.buf[self.start:self.end] + bytearray(
+                    max(len(self.buf), len(data)))
+                self.view = memoryview(self.buf)
+            else:
+                # move remaining bytes at buffer start
+                self.buf[0:remain] = self.buf[self.start:self.end]
+            self.start = 0
+            self.end = remain
+        self.buf[self.end:self.end + len(data)] = data
+        self.end += len(data)
+
+
+class MemoryBuffer(RecvBuffer):
+    """Already received result, bytes or memory mapped file read in place"""
+
+    def __init__(self, data):
+        super(MemoryBuffer, self).__init__(None, 0)
+        # no memoryview, a memory mapped file could not be closed
+        self.buf = data
+        self.view = None
+        self.end = len(data)
+
+    def fill(self, size):
+        """Check size bytes are available, False at end of data"""
+        return self.end - self.start >= size
+
+    def read(self, size):
+        """Read exactly size bytes"""
+        if self.end - self.start < size:
+            raise LispTickException("Connection closed before end of message")
+        res = bytes(self.buf[self.start:self.start + size])
+        self.start += size
+        return res
+
+
+def make_buffer(init_con, size=BUFFER_SIZE):
+    """RecvBuffer reading from a socket, a file, a memory mapped file or bytes"""
+    if isinstance(init_con, RecvBuffer):
+        return init_con
+    if isinstance(init_con, (bytes, bytearray, memoryview)) or is_mmap(init_con):
+        return MemoryBuffer(init_con)
+    return RecvBuffer(init_con, size)
+
+
 class LisptickReader():
     """Reader dedicated to LispTick communication and Sexp Serialization"""
 
-    def __init__(self, init_con):
+    def __init__(self, init_con, buffer_size=BUFFER_SIZE, time_decoder=None):
         self.con = init_con
+        self.recv_buffer = make_buffer(init_con, buffer_size)
+        # function from nano seconds since epoch to decoded time
+        self.time_decoder = time_decoder_function(time_decoder)
         self.tserie = {}
         self.sizes = {}
         self.where = {}
+        # error message of last walked result
+        self.error = ""
+        # walk aborted by stop, remaining result is not read
+        self.stopped = False
+        # decode tensors as numpy arrays instead of Tensor, needs numpy
+        self.tensor_array = False
+        # ReaderStats of instrumented reader, see instrument
+        self.stats = None
+        # result ended by Sentinel.End, not by connection close
+        self.complete = False
+        # keep point times as nano seconds since epoch
+        self.raw_time = False
+        # called with (uid, times, values) numpy arrays for runs of points
+        # of a same timeserie, only used with raw_time
+        self.bulk = None
+        # value decoder by type byte, None for types handled by read_element
+        self.decoders = [None] * 256
+        for idt, decoder in [
+                (TINT, self._get_int), (TFLOAT, self._get_float), (TTIME, self._get_time),
+                (TDURATION, self._get_duration), (TSTRING, self._get_string),
+                (TARRAYSERIAL, self._get_serial_array), (TSENTINEL, self._get_sentinel),
+                (TBOOL, self._get_bool), (TDEC64, self._get_dec64), (TPAIR, self._get_pair),
+                (THEARTBEAT, self._get_heartbeat), (TTENSOR, self._get_tensor)]:
+            self.decoders[idt[0]] = decoder
+        # same decoders for values nested in pairs, arrays, tensors and
+        # heartbeats, never instrumented
+        self.serial_decoders = list(self.decoders)
 
     def __str__(self):
         res = "[ ts: "+str(self.tserie) + ", sizes: " + str(self.sizes)
         res += ", where: "+str(self.where)+" ]"
         return res
 
-    def walk_result(self, func):
-        """Walk LispTick received result message, callinf func for each element"""
+    def walk_result(self, func, limit=-1):
+        """Walk LispTick received result message, callinf func for each element
+
+        func can call stop to abort the walk, limit if not -1 stops it after
+        limit elements, heartbeats not counted.
+        """
+        for uid, value in self.iter_result(limit):
+            func(self, uid, value)
+        return self.error
+
+    def instrument(self, hooks=None, cached=False):
+        """Measure result reading into a new ReaderStats, returned
+
+        To call before reading result, hooks is an optional StatsHooks,
+        cached flags a result replayed from a ResultCache. A reader not
+        instrumented has no measurement overhead.
+        """
+        self.stats = ReaderStats(hooks, cached)
+        self.stats.instrument(self)
+        return self.stats
+
+    def iter_result(self, limit=-1):
+        """Generator of (uid, value) decoded one by one from received message
+
+        At the end self.error holds LispTick error message, if any.
+        Generator ends after limit elements, heartbeats not counted, or
+        when stop is called.
+        """
+        if self.stats is not None:
+            return self.stats.iterate(self._iter_result(limit))
+        return self._iter_result(limit)
+
+    def _iter_result(self, limit):
+        # iter_result generator, not instrumented
+        self.error = ""
+        self.stopped = False
+        while not self.stopped:
+            if self.bulk is not None and self._get_bulk_points():
+                continue
+            element = self.read_element()
+            if element is None:
+                return
+            if limit > -1 and not isinstance(element[1], HeartBeat):
+                if limit == 0:
+                    self.stopped = True
+                    return
+                limit -= 1
+            yield element
+
+    def stop(self):
+        """Abort walk, remaining result is left unread
+
+        Connection can not be reused, it is closed by its owner.
+        """
+        self.stopped = True
+
+    def read_element(self):
+        """Read next element as (uid, value), None at the end of result
+
+        Array and timeserie headers are consumed on the way. At the end
+        self.error holds LispTick error message, if any.
+        """
         err = ""
+        recv = self.recv_buffer
         while True:
-            # do not call fix received as end is in fact nothing received...
-            idt = self.con.recv(1)
-            if idt == b'':
+            if recv.end - recv.start >= POINT_RECORD_SIZE:
+                # fast path, whole timeserie point decoded at once
+                point = self._get_point(recv)
+                if point is not None:
+                    return point
+            # end is in fact nothing received...
+            head = recv.read_head()
+            if head is None:
                 # nothing received, this is the end
-                return err
-            uid_bin = struct.unpack('>BBB', self._fix_size_recv(3))
-            uid = int((uid_bin[2]*256 + uid_bin[1])*256 + uid_bin[0])
-            if idt == TERROR:
-                err = self._get_string()
-            elif idt == TINT:
-                res = self._get_int()
-            elif idt == TFLOAT:
-                res = self._get_float()
-            elif idt == TTIME:
-                res = self._get_time()
-            elif idt == TDURATION:
-                res = self._get_duration()
-            elif idt == TSTRING:
-                res = self._get_string()
-            elif idt == TARRAY:
+                self.error = err
+                return None
+            idt = head & 0xFF
+            uid = head >> 8
+            decoder = self.decoders[idt]
+            if decoder is not None:
+                res = decoder()
+                if idt == TSENTINEL[0] and res == Sentinel.End:
+                    # this is the end
+                    self.complete = True
+                    self.error = err
+                    return None
+            elif idt == TARRAY[0]:
                 # parallel array, retreive array header
                 self._get_array_header(uid)
                 # read next info
                 continue
-            elif idt == TARRAYSERIAL:
-                # serialized array
-                res = self._serial_get(idt)
-            elif idt == TTIMESERIE:
+            elif idt == TTIMESERIE[0]:
                 self.tserie[uid] = self._get_timeserie_label()
                 continue
-            elif idt == TSENTINEL:
-                res = self._get_sentinel()
-                if res == Sentinel.End:
-                    # this is the end
-                    return err
-            elif idt == TBOOL:
-                res = self._get_bool()
-            elif idt == TDEC64:
-                res = self._get_dec64()
-            elif idt == TPAIR:
-                res = self._get_pair()
-            elif idt == THEARTBEAT:
-                res = self._get_heartbeat()
-            elif idt == TTENSOR:
-                res = self._get_tensor()
+            elif idt == TERROR[0]:
+                err = self._get_string()
             else:
                 err = "Unhandled type %d" % idt
             if err != "":
-                return err
+                self.error = err
+                return None
             # Is it from a timeserie ?
-            if self._is_in_timeserie(uid):
+            if uid in self.tserie:
                 # always time after timeserie element
-                time = self._get_time()
-                point = Point(time, res)
-                func(self, uid, point)
-            else:
-                func(self, uid, res)
-        return err
+                if self.raw_time:
+                    time = self._get_int()
+                else:
+                    time = self._get_time()
+                return uid, Point(time, res)
+            return uid, res
+
+    def _get_point(self, recv):
+        """Timeserie point with a fixed size value as (uid, Point), None if not"""
+        codec = POINT_CODECS.get(recv.buf[recv.start])
+        if codec is None:
+            return None
+        head, value, epoch = codec[0].unpack_from(recv.buf, recv.start)
+        uid = head >> 8
+        if uid not in self.tserie:
+            return None
+        recv.start += POINT_RECORD_SIZE
+        if codec[1] is not None:
+            value = codec[1](value)
+        if not self.raw_time:
+            epoch = self.time_decoder(epoch)
+        return uid, Point(epoch, value)
 
-    def get_result(self, limit=-1):
-        """Retrieve complet result by calling walk_result internally"""
+    def get_result(self, limit=-1, compact=False, partial=False):
+        """Retrieve complet result by calling walk_result internally
+
+        With compact=True timeseries are TimeSerie instead of lists of Point.
+        With limit, reading stops on the first point over limit points and
+        connection is closed. The first limit points are then returned if
+        partial, else raised with LimitReached.
+        """
         context = ReaderContext(limit)
+        if not compact:
+            err = self.walk_result(self._result_closure(context))
+            return self._context_result(context, err, partial)
+
+        def add_run(uid, times, values):
+            """fill timeserie with a run of points"""
+            tserie = context.get_timeserie(uid)
+            if tserie is None:
+                tserie = TimeSerie(self.tserie.get(uid), self.time_decoder)
+                context.set_timeserie(uid, tserie)
+            tserie.extend(times, values)
+            pos, is_in_array = self._get_array_where(uid)
+            if is_in_array:
+                array = context.get_array(pos.uid)
+                if array is None:
+                    array = [None] * self._get_array_size_by_id(pos.uid)
+                    context.set_array(pos.uid, array)
+                array[pos.pos] = tserie
+
+        self.raw_time = True
+        if numpy is not None:
+            self.bulk = self._bulk_closure(context, add_run)
+        try:
+            err = self.walk_result(self._result_closure(context, compact))
+        finally:
+            self.raw_time = False
+            self.bulk = None
+        return self._context_result(context, err, partial)
+
+    def _bulk_closure(self, context, add_run):
+        # closure counting bulk points in context, then calling add_run
+        def bulk(uid, times, values):
+            """fill result with a run of points, called by walk"""
+            if context.limit_reached:
+                return
+            if context.size_limit > -1 and context.limit + len(values) > context.size_limit:
+                values = values[:context.size_limit - context.limit]
+                times = times[:len(values)]
+                context.limit_reached = True
+                self.stop()
+            context.limit += len(values)
+            if len(values) > 0:
+                add_run(uid, times, values)
 
+        return bulk
+
+    def _result_closure(self, context, compact=False):
+        # closure filling context with walked result
         def closure(_, uid, value):
             """fill result, called by walk"""
             if isinstance(value, HeartBeat):
                 # heartbeat nothing to do, just read it
                 return
             if context.update_limit_and_check():
+                self.stop()
                 return
             # are we in an array ???
             pos, is_in_array = self._get_array_where(uid)
@@ -306,9 +3510,15 @@ class LisptickReader():
                 tserie = context.get_timeserie(uid)
                 if tserie is None:
                     # 1st create it
-                    tserie = []
+                    if compact:
+                        tserie = TimeSerie(self.tserie.get(uid), self.time_decoder)
+                    else:
+                        tserie = []
                 # this is a timeserie so recive a Point
-                tserie.append(value)
+                if compact:
+                    tserie.add(value.time, value.i)
+                else:
+                    tserie.append(value)
                 context.set_timeserie(uid, tserie)
             if is_in_array:
                 # this is part of array pos.uid
@@ -327,16 +3537,25 @@ class LisptickReader():
                 context.res = value
             return
 
-        err = self.walk_result(closure)
+        return closure
 
-        if (err == "") & context.limit_reached:
-            self.con.close()
-            raise LispTickException(
-                "Points limit reached, use streaming or (graphsample)")
+    def _context_result(self, context, err, partial=False):
+        # complete result from filled context
         if err != "":
-            self.con.close()
+            self._close()
             raise LispTickException(err)
+        if context.limit_reached:
+            # remaining points are not read
+            self._close()
+            res = self._context_value(context)
+            if partial:
+                return res
+            raise LimitReached(
+                "Points limit reached, use streaming or (graphsample)", res)
+        return self._context_value(context)
 
+    def _context_value(self, context):
+        # result value from filled context
         root_array = context.get_array(0)
         if root_array is not None:
             # is array
@@ -344,7 +3563,7 @@ class LisptickReader():
             # to do store timeserie uid in array ??
             i = 0
             for val in root_array:
-                if isinstance(val, list):
+                if isinstance(val, (list, TimeSerie)):
                     context.arrays[0][i] = context.get_timeserie(i+1)
                     i = i + 1
             context.res = root_array
@@ -355,54 +3574,308 @@ class LisptickReader():
                     context.res = tserie
         return context.res
 
+    def get_columns(self, limit=-1, partial=False):
+        """Retrieve complete result with timeseries as numpy arrays
+
+        A timeserie is returned as a (times, values) pair of arrays,
+        times as datetime64[ns] and values as bool, int64, float64 or object.
+        A root array containing timeseries is returned as a dict keyed by
+        timeserie label, or uid if label is empty or not unique.
+        limit and partial are handled as by get_result.
+        """
+        if numpy is None:
+            raise LispTickException("numpy is needed for columnar results")
+        context = ReaderContext(limit)
+        columns = {}
+
+        def closure(_, uid, value):
+            """fill columns, called by walk"""
+            if isinstance(value, HeartBeat):
+                # heartbeat nothing to do, just read it
+                return
+            if context.update_limit_and_check():
+                self.stop()
+                return
+            pos, is_in_array = self._get_array_where(uid)
+            if self._is_in_timeserie(uid):
+                column = columns.get(uid)
+                if column is None:
+                    column = Column()
+                    columns[uid] = column
+                column.append(value.time, value.i)
+            elif is_in_array:
+                array = context.get_array(pos.uid)
+                if array is None:
+                    array = [None] * self._get_array_size_by_id(pos.uid)
+                    context.set_array(pos.uid, array)
+                array[pos.pos] = value
+            else:
+                context.res = value
+
+        def add_run(uid, times, values):
+            """fill column with a run of points"""
+            column = columns.get(uid)
+            if column is None:
+                column = Column()
+                columns[uid] = column
+            column.extend(times, values)
+
+        self.raw_time = True
+        self.tensor_array = True
+        self.bulk = self._bulk_closure(context, add_run)
+        try:
+            err = self.walk_result(closure)
+        finally:
+            self.raw_time = False
+            self.tensor_array = False
+            self.bulk = None
+
+        if err != "":
+            self._close()
+            raise LispTickException(err)
+
+        for uid, column in columns.items():
+            columns[uid] = column.finish()
+        if self._get_array_size_by_id(0) is not None:
+            res = self._root_columns(context, columns)
+        elif len(columns) == 1:
+            res = list(columns.values())[0]
+        else:
+            res = context.res
+        if context.limit_reached:
+            # remaining points are not read
+            self._close()
+            if not partial:
+                raise LimitReached(
+                    "Points limit reached, use streaming or (graphsample)", res)
+        return res
+
+    def walk_arrow(self, func, batch_size=ARROW_BATCH_SIZE):
+        """Walk result calling func(reader, uid, batch) with pyarrow record batches
+
+        Points of each timeserie are gathered in "time" and "value"
+        columns, runs of points decoded at once without Point objects.
+        A batch is passed when it has batch_size points or when no more data
+        is received yet, so live results are not delayed.
+        Values that are not timeseries points are skipped.
+        Returns LispTick error message, if any.
+        """
+        if pyarrow is None or numpy is None:
+            raise LispTickException("pyarrow is needed for Arrow results")
+        recv = self.recv_buffer
+        columns = {}
+
+        def flush():
+            for uid, column in list(columns.items()):
+                del columns[uid]
+                func(self, uid, arrow_batch(*column.finish()))
+
+        def column(uid):
+            res = columns.get(uid)
+            if res is None:
+                res = Column(min(batch_size, COLUMN_CAPACITY))
+                columns[uid] = res
+            return res
+
+        def add_run(uid, times, values):
+            """gather a run of points, called by walk"""
+            start = 0
+            while start < len(times):
+                points = column(uid)
+                end = start + batch_size - len(points)
+                points.extend(times[start:end], values[start:end])
+                start = end
+                if len(points) >= batch_size:
+                    del columns[uid]
+                    func(self, uid, arrow_batch(*points.finish()))
+            if recv.end == recv.start:
+                flush()
+
+        def closure(_, uid, value):
+            """gather points, called by walk"""
+            if self._is_in_timeserie(uid):
+                points = column(uid)
+                points.append(value.time, value.i)
+                if len(points) >= batch_size:
+                    del columns[uid]
+                    func(self, uid, arrow_batch(*points.finish()))
+            if recv.end == recv.start:
+                # next element would wait for data
+                flush()
+
+        self.raw_time = True
+        self.bulk = add_run
+        try:
+            err = self.walk_result(closure)
+        finally:
+            self.raw_time = False
+            self.bulk = None
+        if err == "" and not self.stopped:
+            flush()
+        return err
+
+    def spill(self, directory, chunk_points=SPILL_CHUNK_POINTS):
+        """Write timeseries of result to .npy chunk files, return a SpilledResult
+
+        Points are written to directory every chunk_points points of a
+        timeserie, so memory use does not depend on result size. Other
+        values of result are saved in others.bin, as wire elements.
+        """
+        if numpy is None:
+            raise LispTickException("numpy is needed for spilled results")
+        os.makedirs(directory, exist_ok=True)
+        writers = {}
+        others = {}
+
+        def writer(uid):
+            res = writers.get(uid)
+            if res is None:
+                res = ChunkWriter(directory, "ts%d" % uid, chunk_points)
+                writers[uid] = res
+            return res
+
+        def closure(_, uid, value):
+            """write points, called by walk"""
+            if isinstance(value, HeartBeat):
+                # heartbeat nothing to do, just read it
+                return
+            if self._is_in_timeserie(uid):
+                writer(uid).append(value.time, value.i)
+            else:
+                pos, is_in_array = self._get_array_where(uid)
+                others[pos.pos if is_in_array else 0] = value
+
+        self.raw_time = True
+        self.bulk = lambda uid, times, values: writer(uid).extend(times, values)
+        res = None
+        try:
+            err = self.walk_result(closure)
+            if err != "":
+                self._close()
+                raise LispTickException(err)
+            for chunks in writers.values():
+                chunks.flush()
+            res = self._spill_index(directory, writers, others)
+        finally:
+            self.raw_time = False
+            self.bulk = None
+            if res is None:
+                # failed, no chunk file left behind
+                for chunks in writers.values():
+                    chunks.remove()
+        return res
+
+    def _spill_index(self, directory, writers, others):
+        # write index of spilled chunks, then open them
+        uids = list(self.tserie)
+        if self._get_array_size_by_id(0) is not None:
+            # root array order
+            uids.sort(key=lambda uid: self.where[uid].pos if uid in self.where else -1)
+        labels = [self.tserie.get(uid) for uid in uids]
+        timeseries = []
+        for uid, label in zip(uids, labels):
+            key = label if label and labels.count(label) == 1 else uid
+            chunks = writers[uid].chunks if uid in writers else []
+            timeseries.append({"key": key, "uid": uid, "label": label, "chunks": chunks})
+        index = {"timeseries": timeseries, "others": list(others)}
+        path = os.path.join(directory, SpilledResult.OTHERS)
+        temp = os.path.join(directory, SpilledResult.INDEX + ".tmp")
+        remove_file(path)
+        try:
+            if others:
+                write_elements(path, others.values())
+            with open(temp, "w") as out:
+                json.dump(index, out)
+            os.replace(temp, os.path.join(directory, SpilledResult.INDEX))
+        except BaseException:
+            remove_file(path)
+            raise
+        finally:
+            remove_file(temp)
+        return SpilledResult(directory)
+
+    def _root_columns(self, context, columns):
+        # root array as a dict when it contains timeseries
+        root_array = context.get_array(0)
+        if root_array is None:
+            root_array = [None] * self._get_array_size_by_id(0)
+        uids = [None] * len(root_array)
+        for uid, pos in self.where.items():
+            if pos.uid == 0:
+                uids[pos.pos] = uid
+        if len(columns) == 0:
+            return root_array
+        labels = [self.tserie.get(uid) for uid in uids]
+        res = {}
+        for i, uid in enumerate(uids):
+            key = labels[i]
+            if not key or labels.count(key) > 1:
+                key = uid
+            if uid in columns:
+                res[key] = columns[uid]
+            elif self._is_in_timeserie(uid):
+                # timeserie without any point
+                res[key] = Column().finish()
+            else:
+                res[key] = root_array[i]
+        return res
+
+    def _get_bulk_points(self):
+        """Decode at once a run of buffered points of a same timeserie"""
+        recv = self.recv_buffer
+        if recv.end - recv.start < BULK_MIN_RUN * POINT_RECORD_SIZE:
+            return False
+        buf = recv.buf
+        start = recv.start
+        if buf[start] not in BULK_TYPES:
+            return False
+        # cheap check on next point before scanning the buffer
+        if buf[start:start + 4] != buf[start + POINT_RECORD_SIZE:start + POINT_RECORD_SIZE + 4]:
+            return False
+        uid = (buf[start + 3]*256 + buf[start + 2])*256 + buf[start + 1]
+        if not self._is_in_timeserie(uid):
+            return False
+        records = numpy.frombuffer(
+            buf, dtype=point_record,
+            count=(recv.end - start) // POINT_RECORD_SIZE, offset=start)
+        heads = records['head']
+        breaks = numpy.flatnonzero(heads != heads[0])
+        run = breaks[0] if len(breaks) > 0 else len(records)
+        if run < BULK_MIN_RUN:
+            return False
+        records = records[:run]
+        times = numpy.ascontiguousarray(records['time'])
+        values = bulk_values(buf[start], numpy.ascontiguousarray(records['value']))
+        recv.start += run * POINT_RECORD_SIZE
+        self.bulk(uid, times, values)
+        return True
+
     def _serial_get(self, idt):
         """Element has been serialized as it is a point of a timeserie"""
         # Retreive result type
-        if idt == TERROR:
+        decoder = self.serial_decoders[idt]
+        if decoder is not None:
+            return decoder()
+        if idt == TNULL[0]:
+            return None
+        if idt == TERROR[0]:
             err = self._get_string()
-            self.con.close()
+            self._close()
             raise LispTickException(err)
-        elif idt == TNULL:
-            return None
-        elif idt == TINT:
-            return self._get_int()
-        elif idt == TFLOAT:
-            return self._get_float()
-        elif idt == TTIME:
-            return self._get_time()
-        elif idt == TDURATION:
-            return self._get_duration()
-        elif idt == TSTRING:
-            return self._get_string()
-        elif idt == TARRAYSERIAL:
-            # serialized array
-            # read size
-            size = struct.unpack("<q", self._fix_size_recv(8))[0]
-            res = [None] * size
-            for i in range(0, size):
-                serial_type = self._fix_size_recv(1)
-                if serial_type == b'':
-                    return None
-                # consume unused id
-                struct.unpack('>BBB', self._fix_size_recv(3))
-                res[i] = self._serial_get(serial_type)
-            return res
-        elif idt == TSENTINEL:
-            return self._get_sentinel()
-        elif idt == TBOOL:
-            return self._get_bool()
-        elif idt == TDEC64:
-            return self._get_dec64()
-        elif idt == TPAIR:
-            return self._get_pair()
-        elif idt == THEARTBEAT:
-            return self._get_heartbeat()
-        elif idt == TTENSOR:
-            return self._get_tensor()
-        else:
-            error = "Unhandled type %d" % idt
-            self.con.close()
-            raise LispTickException(error)
+        error = "Unhandled type %d" % idt
+        self._close()
+        raise LispTickException(error)
+
+    def _get_serial_array(self):
+        """Serialized array, size then serialized elements"""
+        size = self.recv_buffer.unpack(INT_STRUCT)[0]
+        res = [None] * size
+        for i in range(0, size):
+            serial_type = self.recv_buffer.read_type()
+            if serial_type is None:
+                return None
+            res[i] = self._serial_get(serial_type)
+        return res
 
     def _get_array_where(self, uid):
         # tell if it is in an Array and where
@@ -416,24 +3889,16 @@ class LisptickReader():
 
     def _is_in_timeserie(self, uid):
         # tell if it is in a timeserie
-        if self.tserie.get(uid) is not None:
-            return True
-        return False
+        return uid in self.tserie
 
     def _get_array_header(self, uid):
         # get array size return read size
-        self.sizes[uid] = struct.unpack("<q", self._fix_size_recv(8))[0]
+        self.sizes[uid] = self.recv_buffer.unpack(INT_STRUCT)[0]
         for i in range(0, self.sizes.get(uid)):
-            header_type = self._fix_size_recv(1)
-            if header_type == b'':
-                return
-            header_uid = self._fix_size_recv(3)
-            if header_uid == b'':
+            head = self.recv_buffer.read_head()
+            if head is None:
                 return
-            header_uid = struct.unpack('>BBB', header_uid)
-            header_uid = int(
-                (header_uid[2]*256 + header_uid[1])*256 + header_uid[0])
-            self.where[header_uid] = InArray(uid, i)
+            self.where[head >> 8] = InArray(uid, i)
 
     def _get_timeserie_label(self):
         # size is number of points -> x8 to have bytes...
@@ -443,122 +3908,261 @@ class LisptickReader():
 
     def _get_int(self):
         """Int64 LittleEndian"""
-        return struct.unpack('<q', self._fix_size_recv(8))[0]
+        return self.recv_buffer.unpack(INT_STRUCT)[0]
 
     def _get_sentinel(self):
         """Int64 LittleEndian"""
-        return Sentinel(struct.unpack('<q', self._fix_size_recv(8))[0])
+        return Sentinel(self.recv_buffer.unpack(INT_STRUCT)[0])
 
     def _get_dec64(self):
         """Dec64 special encoding see https://www.crockford.com/dec64.html"""
-        d64 = struct.unpack('<q', self._fix_size_recv(8))[0]
-        if (d64 % 256) > 127:
-            return (d64 >> 8) / factors[256 - (d64 % 256)]
-        else:
-            return (d64 >> 8) * factors[d64 % 256]
+        return dec64(self.recv_buffer.unpack(INT_STRUCT)[0])
 
     def _get_float(self):
         """Float64 LittleEndian"""
-        return struct.unpack('<d', self._fix_size_recv(8))[0]
+        return self.recv_buffer.unpack(FLOAT_STRUCT)[0]
 
     def _get_time(self):
         """Nano second since epoch as a Int64"""
         # UnixNano time
-        epoch = struct.unpack('<q', self._fix_size_recv(8))[0]
-        # Python only handles microsecond
-        return epoch_datetime(epoch)
+        epoch = self.recv_buffer.unpack(INT_STRUCT)[0]
+        # Python only handles microsecond, keep nano with NanoTime
+        return self.time_decoder(epoch)
 
     def _get_duration(self):
         """Nano seconds duration as a Int64"""
         # UnixNano time
-        year = struct.unpack('<q', self._fix_size_recv(8))[0]
-        month = struct.unpack('<q', self._fix_size_recv(8))[0]
-        day = struct.unpack('<q', self._fix_size_recv(8))[0]
-        epoch = struct.unpack('<q', self._fix_size_recv(8))[0]
+        year, month, day, epoch = self.recv_buffer.unpack(DURATION_STRUCT)
         # Python only handles microsecond
         # round year and month to days
         return Duration(year, month, day, epoch)
 
     def _get_string(self):
         """Simple string from socket, first size then string"""
-        size = struct.unpack("<q", self._fix_size_recv(8))[0]
+        size = self.recv_buffer.unpack(INT_STRUCT)[0]
         return str(self._fix_size_recv(size).decode())
 
     def _get_bool(self):
-        if struct.unpack('<q', self._fix_size_recv(8))[0] == 0:
+        if self.recv_buffer.unpack(INT_STRUCT)[0] == 0:
             return False
         return True
 
     def _get_pair(self):
-        serial_type = self._fix_size_recv(1)
-        if serial_type == b'':
+        serial_type = self.recv_buffer.read_type()
+        if serial_type is None:
             return (None, None)
-        # consume unused ID
-        struct.unpack('>BBB', self._fix_size_recv(3))
         head = self._serial_get(serial_type)
-        serial_type = self._fix_size_recv(1)
-        if serial_type == b'':
+        serial_type = self.recv_buffer.read_type()
+        if serial_type is None:
             return (head, None)
-        # consume unused ID
-        struct.unpack('>BBB', self._fix_size_recv(3))
         return (head, self._serial_get(serial_type))
 
     def _get_heartbeat(self):
         """HeartBeat gives progression and ensure client is still listening"""
-        serial_type = self._fix_size_recv(1)
-        if serial_type == b'':
+        serial_type = self.recv_buffer.read_type()
+        if serial_type is None:
             return None
-        # consume unused ID
-        struct.unpack('>BBB', self._fix_size_recv(3))
         value = self._serial_get(serial_type)
         return HeartBeat(value)
 
     def _get_tensor(self):
-        serial_type = self._fix_size_recv(1)
-        if serial_type == b'':
+        serial_type = self.recv_buffer.read_type()
+        if serial_type is None:
             return None
-        # consume unused ID
-        struct.unpack('>BBB', self._fix_size_recv(3))
         shape = self._serial_get(serial_type)
+        if self.tensor_array and numpy is not None:
+            return self._get_tensor_array(shape)
         tensor = Tensor(shape)
 
         # too verbose experimental implementation
         # in future will be gzip list of same type
         for i in range(tensor.get_size()):
-            serial_type = self._fix_size_recv(1)
-            if serial_type == b'':
+            serial_type = self.recv_buffer.read_type()
+            if serial_type is None:
                 return None
-            # consume unused ID
-            struct.unpack('>BBB', self._fix_size_recv(3))
             value = self._serial_get(serial_type)
             tensor.values[i] = value
         return tensor
 
+    def _get_tensor_array(self, shape):
+        """Tensor values decoded into a numpy array of shape
+
+        Buffered runs of int, float, bool or dec64 values are decoded at
+        once, other values one by one into an object array.
+        """
+        recv = self.recv_buffer
+        size = Tensor(shape).get_size()
+        res = None
+        done = 0
+        while done < size:
+            if recv.end == recv.start and not recv.fill(1):
+                return None
+            idt = recv.buf[recv.start]
+            if idt not in BULK_TYPES:
+                value = self._serial_get(recv.read_type())
+                if res is None:
+                    res = numpy.empty(size, 'object')
+                elif res.dtype != object:
+                    res = res.astype('object')
+                res[done] = value
+                done += 1
+                continue
+            # at least one record, then all buffered ones
+            if not recv.fill(ELEMENT_RECORD_SIZE):
+                raise LispTickException("Connection closed before end of message")
+            count = min(size - done, recv.available() // ELEMENT_RECORD_SIZE)
+            records = numpy.frombuffer(recv.buf, dtype=element_record,
+                                       count=count, offset=recv.start)
+            breaks = numpy.flatnonzero((records['head'] & 0xFF) != idt)
+            if len(breaks) > 0:
+                count = breaks[0]
+            values = bulk_values(idt, numpy.ascontiguousarray(records['value'][:count]))
+            del records
+            if res is None:
+                res = numpy.empty(size, values.dtype)
+            elif res.dtype != values.dtype and res.dtype != object:
+                # mixed types
+                res = res.astype('object')
+            res[done:done + count] = values
+            recv.start += count * ELEMENT_RECORD_SIZE
+            done += count
+        if res is None:
+            res = numpy.empty(size, 'float64')
+        return res.reshape(shape)
+
+    def _close(self):
+        """Close connection, if it can be closed"""
+        if is_mmap(self.con):
+            close_mmap(self.con)
+            return
+        close = getattr(self.con, "close", None)
+        if close is not None:
+            close()
+
     def _fix_size_recv(self, size):
         """Ensure size is received and not less"""
-        res = self.con.recv(size)
-        while len(res) < size:
-            res += self.con.recv(size - len(res))
-        return res
+        return self.recv_buffer.read(size)
+
+
+def bulk_values(idt, values):
+    """Int64 numpy array of fixed size values of type idt decoded"""
+    if idt == TFLOAT[0]:
+        return values.view('<f8')
+    if idt == TBOOL[0]:
+        return values != 0
+    if idt == TDEC64[0]:
+        return dec64_array(values)
+    return values
+
+
+def dec64_array(d64):
+    """Dec64 Int64 numpy array to float64 array, same rounding as _get_dec64"""
+    coefficients = (d64 >> 8).astype('float64')
+    exponents = (d64 & 0xFF).astype('int64')
+    negative = exponents > 127
+    res = coefficients * np_factors[numpy.where(negative, 0, exponents)]
+    res[negative] = coefficients[negative] / np_factors[256 - exponents[negative]]
+    return res
 
 
 def epoch_datetime(epoch):
     """Transform 64bits epoch to datetime"""
     # Empty ?
-    if epoch == -6795364578871345152:
+    if epoch == EMPTY_TIME:
         return datetime.time()
     return datetime.datetime.fromtimestamp(epoch / 1e9)
 
 
-def send_message(sock, request):
-    """Send request to LispTick"""
+def epoch_utc(epoch):
+    """Transform 64bits epoch to UTC datetime, nano seconds truncated"""
+    # Empty ?
+    if epoch == EMPTY_TIME:
+        return datetime.time()
+    return UTC_EPOCH + datetime.timedelta(microseconds=epoch // 1000)
+
+
+def time_decoder(mode=TIME_LOCAL, cache=0):
+    """Function from nano seconds since epoch to time, for LisptickReader
+
+    mode is TIME_LOCAL for naive local datetime, TIME_UTC for UTC datetime
+    or TIME_NANO for NanoTime keeping nano seconds. With cache, the last
+    cache distinct times converted are kept, for repeated timestamps.
+    """
+    decoders = {TIME_LOCAL: epoch_datetime, TIME_UTC: epoch_utc, TIME_NANO: NanoTime}
+    if mode not in decoders:
+        raise LispTickException("Unknown time mode " + str(mode))
+    decoder = decoders[mode]
+    if cache > 0:
+        decoder = functools.lru_cache(maxsize=cache)(decoder)
+    return decoder
+
+
+def time_decoder_function(decoder):
+    """Time decoder from a function, a time mode or None for local datetime"""
+    if decoder is None:
+        return epoch_datetime
+    if isinstance(decoder, str):
+        return time_decoder(decoder)
+    return decoder
+
+
+def encode_message(request):
+    """Request for LispTick as size and JSON message bytes"""
     msg = json.dumps({"code": request}).encode()
     if len(msg) > 65536:
         raise RuntimeError("message for LispTick is >64KB")
     bsize = bytearray()
     bsize.append(len(msg) % 256)
     bsize.append(int(len(msg)/256))
-    sock.send(bsize)
+    return bytes(bsize) + msg
+
+
+def encode_element(value, uid=0):
+    """Type byte, uid and payload of a decoded value"""
+    idt, payload = encode_value(value)
+    return idt + HEAD_STRUCT.pack(uid)[:3] + payload
+
+
+def encode_value(value):
+    """Type byte and payload of a decoded value, inverse of _serial_get"""
+    if value is None:
+        return TNULL, b''
+    if isinstance(value, Sentinel):
+        return TSENTINEL, INT_STRUCT.pack(value)
+    if isinstance(value, bool):
+        return TBOOL, INT_STRUCT.pack(int(value))
+    if isinstance(value, NanoTime):
+        return TTIME, INT_STRUCT.pack(value)
+    if isinstance(value, int):
+        return TINT, INT_STRUCT.pack(value)
+    if isinstance(value, float):
+        return TFLOAT, struct.pack('<d', value)
+    if isinstance(value, datetime.datetime):
+        return TTIME, INT_STRUCT.pack(time_nano(value))
+    if isinstance(value, Duration):
+        delta = value.get_timedelta()
+        nano = (delta.seconds * 1000000 + delta.microseconds) * 1000
+        return TDURATION, struct.pack('<qqqq', value.get_year(), value.get_month(),
+                                      delta.days, nano)
+    if isinstance(value, str):
+        data = value.encode()
+        return TSTRING, INT_STRUCT.pack(len(data)) + data
+    if isinstance(value, list):
+        return TARRAYSERIAL, INT_STRUCT.pack(len(value)) + b''.join(
+            encode_element(item) for item in value)
+    if isinstance(value, tuple):
+        return TPAIR, encode_element(value[0]) + encode_element(value[1])
+    if isinstance(value, HeartBeat):
+        return THEARTBEAT, encode_element(value.get_value())
+    if isinstance(value, Tensor):
+        return TTENSOR, encode_element(list(value.shape)) + b''.join(
+            encode_element(item) for item in value.values)
+    raise LispTickException("Cannot encode %r" % (value,))
+
+
+def send_message(sock, request):
+    """Send request to LispTick"""
+    msg = encode_message(request)
     totalsent = 0
     while totalsent < len(msg):
         sent = sock.send(msg[totalsent:])
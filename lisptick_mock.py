@@ -0,0 +1,340 @@
+"""
+Local stand-in of a LispTick server, for offline tests and benchmarks
+Replies to requests with synthetic or recorded LispTick streams.
+"""
+import datetime
+import json
+import socket
+import struct
+import threading
+
+import lisptick
+
+# Time of first synthetic point, 2017-01-01 as nano seconds since epoch
+START = 1483228800000000000
+# Time between synthetic points, 1s in nano seconds
+STEP = 1000000000
+
+# uid of synthetic heartbeats, not used by any timeserie
+HEARTBEAT_UID = 0xFFFFFF
+
+# Timeserie point record: type byte, uid, 8 bytes value and time
+point_struct = struct.Struct('<c3sqq')
+float_point_struct = struct.Struct('<c3sdq')
+
+
+class Dec64():
+    """Dec64 number to send, coefficient * 10 ** exponent"""
+
+    def __init__(self, coefficient, exponent):
+        self.coefficient = coefficient
+        self.exponent = exponent
+
+    def __str__(self):
+        return str(self.coefficient) + "e" + str(self.exponent)
+
+    def encode(self):
+        """Dec64 as Int64"""
+        return (self.coefficient << 8) | (self.exponent & 0xFF)
+
+
+class StreamWriter():
+    """Build a LispTick stream as sent by the server"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def getvalue(self):
+        """Stream bytes"""
+        return bytes(self.data)
+
+    def value(self, value, uid=0):
+        """Append a single value"""
+        self.data += encode_element(value, uid)
+        return self
+
+    def error(self, msg, uid=0):
+        """Append an error message"""
+        self.data += lisptick.TERROR + encode_uid(uid) + encode_string(msg)
+        return self
+
+    def heartbeat(self, value, uid=HEARTBEAT_UID):
+        """Append an heartbeat"""
+        return self.value(lisptick.HeartBeat(value), uid)
+
+    def array(self, uid, children):
+        """Append a parallel array header, children as (type, uid) list"""
+        self.data += lisptick.TARRAY + encode_uid(uid) + struct.pack('<q', len(children))
+        for idt, child in children:
+            self.data += idt + encode_uid(child)
+        return self
+
+    def timeserie(self, uid, label="", points=()):
+        """Append a timeserie header and its (time, value) points"""
+        self.data += lisptick.TTIMESERIE + encode_uid(uid) + encode_string(label)
+        for time, value in points:
+            self.point(uid, time, value)
+        return self
+
+    def point(self, uid, time, value):
+        """Append a timeserie point, time as datetime or nano seconds"""
+        self.data += encode_element(value, uid) + struct.pack('<q', encode_time(time))
+        return self
+
+    def end(self):
+        """Append end of result"""
+        return self.value(lisptick.Sentinel(lisptick.Sentinel.End))
+
+
+class MockServer():
+    """Local LispTick server replying with prepared streams
+
+    responses maps a request code to the stream to send, as bytes, a list
+    of bytes chunks, or a function of the code returning one of them.
+    A response to an unknown code is an error.
+    """
+
+    def __init__(self, responses=None, host="127.0.0.1", port=0, chunk_size=0,
+                 keep_alive=False):
+        if responses is None:
+            responses = sample_responses()
+        self.responses = responses
+        self.chunk_size = chunk_size
+        # serve several requests per connection
+        self.keep_alive = keep_alive
+        self.requests = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.host, self.port = self.sock.getsockname()
+        self.thread = None
+        self.stopped = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        """Listen and serve in a background thread"""
+        self.sock.listen(128)
+        self.thread = threading.Thread(target=self._serve)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Stop listening, connections being served are finished"""
+        self.stopped = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def client(self):
+        """Client lisptick.Socket to this server"""
+        return lisptick.Socket(self.host, self.port)
+
+    def response(self, code):
+        """Stream chunks replying to code"""
+        res = self.responses.get(code)
+        if res is None:
+            return [StreamWriter().error("Unknown request: " + code).getvalue()]
+        if callable(res):
+            res = res(code)
+        if isinstance(res, (bytes, bytearray, memoryview)):
+            return [res]
+        return res
+
+    def _serve(self):
+        while not self.stopped:
+            try:
+                con, _ = self.sock.accept()
+            except OSError:
+                return
+            thread = threading.Thread(target=self._handle, args=(con,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, con):
+        try:
+            while True:
+                code = read_request(con)
+                if code is None:
+                    return
+                self.requests.append(code)
+                for chunk in self.response(code):
+                    self._send(con, chunk)
+                if not self.keep_alive:
+                    return
+        except OSError:
+            # client went away
+            return
+        finally:
+            con.close()
+
+    def _send(self, con, chunk):
+        if self.chunk_size <= 0:
+            con.sendall(chunk)
+            return
+        view = memoryview(chunk)
+        for i in range(0, len(view), self.chunk_size):
+            con.sendall(view[i:i + self.chunk_size])
+
+
+def read_request(con):
+    """Request code framed by send_message, None if connection is closed"""
+    size = recv_exactly(con, 2)
+    if size is None:
+        return None
+    msg = recv_exactly(con, size[0] + size[1] * 256)
+    if msg is None:
+        return None
+    return json.loads(msg.decode())["code"]
+
+
+def recv_exactly(con, size):
+    """size bytes from con, None if connection is closed before"""
+    res = bytearray()
+    while len(res) < size:
+        data = con.recv(size - len(res))
+        if data == b'':
+            return None
+        res += data
+    return bytes(res)
+
+
+def encode_uid(uid):
+    """3 bytes LittleEndian uid"""
+    return struct.pack('<I', uid)[:3]
+
+
+def encode_string(value):
+    """Size then UTF-8 string"""
+    data = value.encode()
+    return struct.pack('<q', len(data)) + data
+
+
+def encode_time(value):
+    """Nano seconds since epoch from datetime or int"""
+    if isinstance(value, datetime.datetime):
+        return int(round(value.timestamp() * 1000000)) * 1000
+    return int(value)
+
+
+def encode_element(value, uid=0):
+    """Type byte, uid and value"""
+    idt, payload = encode_value(value)
+    return idt + encode_uid(uid) + payload
+
+
+def encode_value(value):
+    """Type byte and value payload, inverse of LisptickReader._serial_get"""
+    if value is None:
+        return lisptick.TNULL, b''
+    if isinstance(value, lisptick.Sentinel):
+        return lisptick.TSENTINEL, struct.pack('<q', value)
+    if isinstance(value, bool):
+        return lisptick.TBOOL, struct.pack('<q', int(value))
+    if isinstance(value, int):
+        return lisptick.TINT, struct.pack('<q', value)
+    if isinstance(value, float):
+        return lisptick.TFLOAT, struct.pack('<d', value)
+    if isinstance(value, Dec64):
+        return lisptick.TDEC64, struct.pack('<q', value.encode())
+    if isinstance(value, datetime.datetime):
+        return lisptick.TTIME, struct.pack('<q', encode_time(value))
+    if isinstance(value, lisptick.Duration):
+        delta = value.get_timedelta()
+        nano = (delta.seconds * 1000000 + delta.microseconds) * 1000
+        return lisptick.TDURATION, struct.pack(
+            '<qqqq', value.get_year(), value.get_month(), delta.days, nano)
+    if isinstance(value, str):
+        return lisptick.TSTRING, encode_string(value)
+    if isinstance(value, list):
+        payload = struct.pack('<q', len(value))
+        return lisptick.TARRAYSERIAL, payload + b''.join(encode_element(item) for item in value)
+    if isinstance(value, tuple):
+        return lisptick.TPAIR, encode_element(value[0]) + encode_element(value[1])
+    if isinstance(value, lisptick.HeartBeat):
+        return lisptick.THEARTBEAT, encode_element(value.get_value())
+    if isinstance(value, lisptick.Tensor):
+        payload = encode_element(list(value.shape))
+        return lisptick.TTENSOR, payload + b''.join(encode_element(item) for item in value.values)
+    raise TypeError("Cannot encode %r" % (value,))
+
+
+def timeserie_stream(points, value_type=lisptick.TFLOAT, uid=0, label="",
+                     start=START, step=STEP, heartbeat=0):
+    """Synthetic timeserie of points values i, as value_type
+
+    value_type is TINT, TFLOAT, TBOOL or TDEC64, an heartbeat is sent every
+    heartbeat points if not 0.
+    """
+    writer = StreamWriter().timeserie(uid, label)
+    data = writer.data
+    uid_bin = encode_uid(uid)
+    hb = encode_element(lisptick.HeartBeat(0), HEARTBEAT_UID)[:-8]
+    for i in range(points):
+        if heartbeat and i % heartbeat == 0:
+            data += hb + struct.pack('<q', i)
+        if value_type == lisptick.TFLOAT:
+            data += float_point_struct.pack(value_type, uid_bin, float(i), start + i * step)
+        elif value_type == lisptick.TDEC64:
+            data += point_struct.pack(value_type, uid_bin, i << 8, start + i * step)
+        elif value_type == lisptick.TBOOL:
+            data += point_struct.pack(value_type, uid_bin, i % 2, start + i * step)
+        else:
+            data += point_struct.pack(value_type, uid_bin, i, start + i * step)
+    return writer.end().getvalue()
+
+
+def sample_responses():
+    """Streams answering client_test.py requests, covering every type"""
+    def utc(*args):
+        return datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+    tserie = [(utc(2017, 10, 26, 9, 19), Dec64(486, -1)),
+              (utc(2017, 10, 26, 10, 30), 49),
+              (utc(2017, 10, 26, 11, 51), Dec64(4927, -2))]
+    day = utc(2017, 10, 26)
+    return {
+        "(+ 3 4)": StreamWriter().value(7).end().getvalue(),
+        "(= 3 4)": StreamWriter().value(False).end().getvalue(),
+        "(= 4 4)": StreamWriter().value(True).end().getvalue(),
+        "(- 310.85 273.15)": StreamWriter().value(37.7).end().getvalue(),
+        "(+ 3.04 0.1)": StreamWriter().value(3.14).end().getvalue(),
+        "(/ 10 4)": StreamWriter().value(2.5).end().getvalue(),
+        "2.5": StreamWriter().value(Dec64(25, -1)).end().getvalue(),
+        "0.0000025": StreamWriter().value(Dec64(25, -7)).end().getvalue(),
+        "-0.0000025": StreamWriter().value(Dec64(-25, -7)).end().getvalue(),
+        "(now)": lambda _: StreamWriter().value(datetime.datetime.now()).end().getvalue(),
+        "2017-10-18T10:30": StreamWriter().value(
+            datetime.datetime.fromtimestamp(1508322600)).end().getvalue(),
+        "1Y1M10D10s": StreamWriter().value(
+            lisptick.Duration(1, 1, 10, 1000000000 * 10)).end().getvalue(),
+        "10h": StreamWriter().value(
+            lisptick.Duration(0, 0, 0, 1000000000 * 60 * 60 * 10)).end().getvalue(),
+        "(version)": StreamWriter().value("LispTick v1.0.0").end().getvalue(),
+        '"toto+&"': StreamWriter().value("toto+&").end().getvalue(),
+        "[1 2 3 4]": StreamWriter().array(0, [(lisptick.TINT, i) for i in range(1, 5)])
+                     .value(1, 1).value(2, 2).value(3, 3).value(4, 4).end().getvalue(),
+        '(+ "a" 3)': StreamWriter().error("+: wrong argument type").getvalue(),
+        "(timeserie 2017-10-26T09:19 48.6 2017-10-26T10:30 49 2017-10-26T11:51 49.27)":
+            StreamWriter().timeserie(0, "", tserie).end().getvalue(),
+        "[timeserie timeserie]":
+            StreamWriter().array(0, [(lisptick.TTIMESERIE, 1), (lisptick.TTIMESERIE, 2)])
+            .timeserie(1, "", tserie).timeserie(2, "", tserie).end().getvalue(),
+        "timeserie of arrays":
+            StreamWriter().timeserie(0, "", [
+                (day + datetime.timedelta(hours=9, minutes=19), [1, "a"]),
+                (day + datetime.timedelta(hours=11, minutes=51), [3, "c"])]).end().getvalue(),
+        '(3.5 . "toto")': StreamWriter().value((3.5, "toto")).end().getvalue(),
+        "(hist 3 4 5 4 3 3)": StreamWriter().value([(3, 3), (4, 2), (5, 1)]).end().getvalue(),
+        "(tensor (shape 3 3) [1 2 3 4 5 6 7 8 9])": StreamWriter().value(
+            lisptick.Tensor([3, 3], [float(i) for i in range(1, 10)])).end().getvalue(),
+        "()": StreamWriter().value(lisptick.Sentinel(lisptick.Sentinel.Null)).end().getvalue(),
+        "heartbeats": StreamWriter().heartbeat(1).value(7).heartbeat(2).end().getvalue(),
+    }
@@ -0,0 +1,886 @@
+"""Client of LispTick TimeSerie Streaming Server, tested against a local mock
+Same checks as client_test.py without network access."""
+
+import unittest
+import asyncio
+import datetime
+import threading
+import os
+import shutil
+import socket
+import tempfile
+import time
+import lisptick
+import lisptick_mock
+
+SERVER = lisptick_mock.MockServer(chunk_size=7)
+
+
+def setUpModule():
+    """Start mock server"""
+    SERVER.start()
+
+
+def tearDownModule():
+    """Stop mock server"""
+    SERVER.stop()
+
+
+class OfflineTest(unittest.TestCase):
+    """Class Test LispTick decoding"""
+
+    def test_int(self):
+        """Test Integer (+ 3 4)"""
+        self.assertEqual(mock_get("""(+ 3 4)"""), 7)
+
+    def test_bool(self):
+        """Test boolean"""
+        self.assertEqual(mock_get("""(= 3 4)"""), False)
+        self.assertEqual(mock_get("""(= 4 4)"""), True)
+
+    def test_float(self):
+        """Test Float"""
+        self.assertEqual(mock_get("""(- 310.85 273.15)"""), 37.7)
+        self.assertEqual(mock_get("""(+ 3.04 0.1)"""), 3.14)
+        self.assertEqual(mock_get("""(/ 10 4)"""), 2.5)
+
+    def test_dec64(self):
+        """Test Dec64 as Float"""
+        self.assertEqual(mock_get("""2.5"""), 2.5)
+        self.assertEqual(mock_get("""0.0000025"""), 0.0000025)
+        self.assertEqual(mock_get("""-0.0000025"""), -0.0000025)
+
+    def test_time_duration(self):
+        """Test time & duration"""
+        delta = abs(datetime.datetime.now() - mock_get("""(now)"""))
+        self.assertLess(delta.total_seconds(), 0.128)
+        epoch = 1508322600
+        self.assertEqual(str(mock_get("""2017-10-18T10:30""")),
+                         str(datetime.datetime.fromtimestamp(epoch)))
+        self.assertEqual(str(mock_get("""1Y1M10D10s""")), str(
+            lisptick.Duration(1, 1, 10, 1000000000 * 10)))
+        self.assertEqual(str(mock_get("""10h""")), str(
+            lisptick.Duration(0, 0, 0, 1000000000 * 60 * 60 * 10)))
+
+    def test_string(self):
+        """Test String (version)"""
+        self.assertEqual(mock_get("""(version)"""), "LispTick v1.0.0")
+        self.assertEqual(mock_get('"toto+&"'), "toto+&")
+
+    def test_array(self):
+        """Test Array"""
+        self.assertEqual(mock_get("""[1 2 3 4]"""), [1, 2, 3, 4])
+
+    def test_error(self):
+        """Test Error (+ "a" 3)"""
+        with self.assertRaises(lisptick.LispTickException):
+            mock_get("""(+ "a" 3)""")
+
+    def test_timeserie(self):
+        """Test timeserie"""
+        tserie = mock_get(
+            """(timeserie 2017-10-26T09:19 48.6 2017-10-26T10:30 49 2017-10-26T11:51 49.27)""")
+        self.assertTrue(isinstance(tserie, list))
+        self.assertEqual([point.i for point in tserie], [48.6, 49, 49.27])
+        self.assertEqual(tserie[0].time, local_time(2017, 10, 26, 9, 19))
+        self.assertEqual(tserie[2].time, local_time(2017, 10, 26, 11, 51))
+
+    def test_array_timeserie(self):
+        """Test mutliplexed timeseries"""
+        tserie = mock_get("""[timeserie timeserie]""")
+        self.assertEqual(len(tserie), 2)
+        for i in range(2):
+            self.assertEqual([point.i for point in tserie[i]], [48.6, 49, 49.27])
+            self.assertEqual(tserie[i][1].time, local_time(2017, 10, 26, 10, 30))
+
+    def test_timeserie_array(self):
+        """Test timeserie of arrays"""
+        tserie = mock_get("""timeserie of arrays""")
+        self.assertEqual([point.i for point in tserie], [[1, "a"], [3, "c"]])
+
+    def test_pair(self):
+        """Test Pair (3.5 . "toto")"""
+        self.assertEqual(mock_get("""(3.5 . "toto")"""), (3.5, "toto"))
+
+    def test_hist(self):
+        """Test array of Pairs from histogram"""
+        self.assertEqual(mock_get("""(hist 3 4 5 4 3 3)"""),
+                         [(3, 3), (4, 2), (5, 1)])
+
+    def test_tensor(self):
+        """Test Tensor"""
+        tensor = lisptick.Tensor(
+            [3, 3], [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0])
+        self.assertEqual(
+            str(mock_get("""(tensor (shape 3 3) [1 2 3 4 5 6 7 8 9])""")), str(tensor))
+
+    @unittest.skipIf(lisptick.numpy is None, "numpy is not installed")
+    def test_tensor_array(self):
+        """Test Tensor decoded as numpy array"""
+        values = SERVER.client().get_columns("""(tensor (shape 3 3) [1 2 3 4 5 6 7 8 9])""")
+        self.assertEqual(values.shape, (3, 3))
+        self.assertEqual(values.dtype, lisptick.numpy.float64)
+        self.assertEqual(values.tolist(), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [7.0, 8.0, 9.0]])
+        reader = lisptick.LisptickReader(lisptick_mock.StreamWriter().value(
+            lisptick.Tensor([2, 2], [1, 2.5, "a", 4])).end().getvalue())
+        reader.tensor_array = True
+        self.assertEqual(reader.get_result().tolist(), [[1, 2.5], ["a", 4]])
+
+    def test_sentinel(self):
+        """Test SexpNull"""
+        self.assertEqual(mock_get("""()"""), lisptick.Sentinel.Null)
+
+    def test_heartbeat(self):
+        """Test heartbeats are skipped by get_result"""
+        self.assertEqual(mock_get("""heartbeats"""), 7)
+
+    def test_walk_result(self):
+        """Test walk_result on a synthetic timeserie"""
+        with lisptick_mock.MockServer({"ts": lisptick_mock.timeserie_stream(
+                1000, lisptick.TINT, heartbeat=100)}) as server:
+            values = []
+            server.client().walk_result("ts", lambda _, __, value: values.append(value))
+        points = [value for value in values if isinstance(value, lisptick.Point)]
+        self.assertEqual([point.i for point in points], list(range(1000)))
+        self.assertEqual(len(values) - len(points), 10)
+
+    def test_instrumentation(self):
+        """Test instrumented requests count bytes, elements and heartbeats"""
+        data = lisptick_mock.timeserie_stream(1000, lisptick.TINT, heartbeat=100)
+        ended = []
+        hooks = lisptick.StatsHooks()
+        hooks.on_end = ended.append
+        with lisptick_mock.MockServer({"ts": data}) as server:
+            client = server.client()
+            client.hooks = hooks
+            client.walk_result("ts", lambda *_: None)
+            self.assertEqual(len(client.get_result("ts")), 1000)
+        walked = ended[0]
+        for stats in ended:
+            self.assertEqual(stats.received, len(data))
+            self.assertEqual(stats.elements["int"], 1000)
+            self.assertEqual(stats.heartbeats, 10)
+            self.assertTrue(0 <= stats.first_byte <= stats.first_point <= stats.elapsed)
+        self.assertGreater(walked.recv_calls, 0)
+        self.assertEqual(walked.elements["heartbeat"], 10)
+
+    def test_live(self):
+        """Test live stream resumed after a stall and a lost connection"""
+        data = lisptick_mock.timeserie_stream(100, lisptick.TINT, heartbeat=10)
+
+        def stalled(_):
+            yield data[:len(data) // 3]
+            time.sleep(0.5)
+
+        # lost in the middle of a point, then whole result from start again
+        responses = [stalled(None), [data[:len(data) // 2 + 7]], [data]]
+        ended = []
+        hooks = lisptick.StatsHooks()
+        hooks.on_end = ended.append
+        with lisptick_mock.MockServer() as server:
+            server.response = lambda _: responses.pop(0)
+            client = server.client()
+            client.hooks = hooks
+            start = datetime.datetime.fromtimestamp(lisptick_mock.START // 1000000000)
+            with client.live("ts {start}", start, deadline=0.1) as live:
+                live.delay = 0.01
+                values = [value.i for _, value in live if isinstance(value, lisptick.Point)]
+        self.assertEqual(values, list(range(100)))
+        self.assertEqual((live.stats.stalls, live.stats.disconnects, live.stats.reconnects),
+                         (1, 1, 2))
+        received = sum(stats.elements["int"] for stats in ended)
+        self.assertEqual(live.stats.duplicates, received - 100)
+        self.assertGreater(live.stats.duplicates, 0)
+        self.assertEqual(server.requests[0], "ts 2017-01-01T00:00:00")
+        self.assertNotEqual(server.requests[1], server.requests[0])
+
+    def test_live_join(self):
+        """Test as-of join and bars of a live stream resumed after a lost connection"""
+        writer = lisptick_mock.StreamWriter().array(
+            0, [(lisptick.TTIMESERIE, 1), (lisptick.TTIMESERIE, 2)])
+        writer.timeserie(1, "bid").timeserie(2, "ask")
+        for i in range(40):
+            writer.point(1 + i % 2, lisptick_mock.START + i * lisptick_mock.STEP, i)
+        data = writer.end().getvalue()
+        start = datetime.datetime.fromtimestamp(lisptick_mock.START // 1000000000)
+        rows = list(lisptick.AsOfJoin().join(lisptick.Stream(data)))
+        # lost in the middle of a point, then whole result from start again
+        responses = [[data[:len(data) // 2 + 5]], [data], [data[:len(data) // 3]], [data]]
+        with lisptick_mock.MockServer() as server:
+            server.response = lambda _: responses.pop(0)
+            client = server.client()
+            with client.live("ts {start}", start) as live:
+                live.delay = 0.01
+                self.assertEqual(list(lisptick.AsOfJoin().join(live)), rows)
+            self.assertEqual(live.stats.reconnects, 1)
+            with client.live("ts {start}", start) as live:
+                live.delay = 0.01
+                resampler = lisptick.Resampler(datetime.timedelta(seconds=10))
+                bars = list(resampler.resample(live))
+            self.assertEqual(live.stats.reconnects, 1)
+        self.assertEqual(sorted((uid, bar.count) for uid, bar in bars),
+                         [(1, 5)] * 4 + [(2, 5)] * 4)
+
+    def test_async(self):
+        """Test asyncio requests decoded from 7 bytes chunks"""
+        async def requests():
+            conn = lisptick.AsyncSocket(SERVER.host, SERVER.port)
+            self.assertEqual(await conn.get_result("""(+ 3 4)"""), 7)
+            tserie = await conn.get_result("""[timeserie timeserie]""")
+            self.assertEqual([[point.i for point in serie] for serie in tserie],
+                             [[48.6, 49, 49.27]] * 2)
+            self.assertEqual(tserie[0][1].time, local_time(2017, 10, 26, 10, 30))
+            with self.assertRaises(lisptick.LispTickException):
+                await conn.get_result("""(+ "a" 3)""")
+            self.assertEqual(len(await conn.get_result("""[timeserie timeserie]""",
+                                                       limit=2, partial=True)), 2)
+
+        asyncio.run(requests())
+
+    def test_async_stream(self):
+        """Test leaving an async stream early frees its connection slot"""
+        data = lisptick_mock.timeserie_stream(1000, lisptick.TINT)
+
+        async def requests():
+            conn = lisptick.AsyncSocket(server.host, server.port, max_concurrency=1)
+            values = []
+            async with conn.stream("ts") as stream:
+                async for _, value in stream:
+                    values.append(value)
+                    if len(values) == 3:
+                        break
+            self.assertFalse(conn.semaphore.locked())
+            tserie = await asyncio.wait_for(conn.get_result("ts"), 5)
+            self.assertEqual([point.i for point in tserie], list(range(1000)))
+
+        with lisptick_mock.MockServer({"ts": data}, chunk_size=7) as server:
+            asyncio.run(requests())
+
+    def test_async_concurrency(self):
+        """Test max_concurrency bounds simultaneous connections"""
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def slow(_):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            yield lisptick_mock.StreamWriter().value(7).end().getvalue()
+
+        async def requests():
+            conn = lisptick.AsyncSocket(server.host, server.port, max_concurrency=2)
+            return await asyncio.gather(*[conn.get_result("slow") for _ in range(6)])
+
+        with lisptick_mock.MockServer({"slow": slow}, chunk_size=7) as server:
+            self.assertEqual(asyncio.run(requests()), [7] * 6)
+        self.assertEqual(active[1], 2)
+
+    def test_async_errors(self):
+        """Test failed async requests free their connection slot"""
+        data = lisptick_mock.timeserie_stream(100, lisptick.TINT)
+
+        async def requests(port):
+            conn = lisptick.AsyncSocket(server.host, port, max_concurrency=1)
+            for _ in range(2):
+                with self.assertRaises(OSError):
+                    await conn.get_result("ts")
+            self.assertFalse(conn.semaphore.locked())
+            conn = lisptick.AsyncSocket(server.host, server.port, max_concurrency=2)
+            results = await asyncio.gather(conn.get_result("ts"), conn.get_result("lost"),
+                                           conn.get_result("unknown"), conn.get_result("ts"),
+                                           return_exceptions=True)
+            self.assertEqual([len(result) if isinstance(result, list) else type(result)
+                              for result in results],
+                             [100, lisptick.LispTickException, lisptick.LispTickException, 100])
+            self.assertFalse(conn.semaphore.locked())
+            self.assertEqual(len(await asyncio.wait_for(conn.get_result("ts"), 5)), 100)
+
+        # lost in the middle of a point
+        with lisptick_mock.MockServer({"ts": data, "lost": data[:len(data) // 2 + 5]},
+                                      chunk_size=7) as server:
+            asyncio.run(requests(closed_port()))
+
+    def test_session_reuse(self):
+        """Test pooled connections are reused only after a whole result"""
+        data = lisptick_mock.timeserie_stream(10000, lisptick.TINT)
+        with lisptick_mock.MockServer({"(+ 3 4)": lisptick_mock.StreamWriter().value(
+                7).end().getvalue(), "ts": data}, keep_alive=True) as server:
+            with lisptick.Session(server.host, server.port, size=1, reuse=True) as session:
+                wait_refill(session.pool)
+                for _ in range(5):
+                    self.assertEqual(session.get_result("""(+ 3 4)"""), 7)
+                stats = session.stats
+                self.assertEqual((stats.connects, stats.acquires, stats.reused, stats.queries),
+                                 (1, 5, 5, 5))
+                # stopped and limited results leave data behind, connection is closed
+                session.walk_result("ts", lambda reader, _, __: reader.stop())
+                self.assertEqual(len(session.get_result("ts", limit=2, partial=True)), 2)
+                self.assertEqual(len(session.get_result("ts")), 10000)
+                self.assertEqual(session.get_result("""(+ 3 4)"""), 7)
+                self.assertEqual((stats.connects, stats.acquires, stats.reused, stats.queries),
+                                 (3, 9, 7, 9))
+                self.assertEqual(stats.failed_checks, 0)
+                self.assertGreater(stats.query_time, 0.0)
+
+    def test_session_errors(self):
+        """Test failed queries are counted and release their connection"""
+        with lisptick_mock.MockServer(keep_alive=True) as server:
+            with lisptick.Session(server.host, server.port, size=1, reuse=True) as session:
+                wait_refill(session.pool)
+                for _ in range(5):
+                    with self.assertRaises(lisptick.LispTickException):
+                        session.get_result("unknown")
+                with self.assertRaises(ZeroDivisionError):
+                    session.walk_result("""(+ 3 4)""", lambda *_: 1 / 0)
+                self.assertEqual(len(session.started), 0)
+                self.assertEqual((session.stats.queries, session.stats.failed,
+                                  session.stats.reused), (6, 6, 0))
+                self.assertEqual(session.get_result("""(+ 3 4)"""), 7)
+                self.assertEqual((session.stats.queries, session.stats.failed), (7, 6))
+
+    def test_pool_unreachable(self):
+        """Test pool refill and requests when server is unreachable or lost"""
+        with lisptick.Session("127.0.0.1", closed_port(), size=2) as session:
+            wait_refill(session.pool)
+            self.assertEqual(len(session.pool.idle), 0)
+            with self.assertRaises(OSError):
+                session.get_result("""(+ 3 4)""")
+            self.assertEqual(len(session.started), 0)
+            self.assertEqual((session.stats.connects, session.stats.acquires), (0, 0))
+        data = lisptick_mock.timeserie_stream(100, lisptick.TINT)
+        # connection closed by server in the middle of result
+        with lisptick_mock.MockServer({"lost": data[:len(data) // 2]}) as server:
+            with lisptick.Session(server.host, server.port, size=1, reuse=True) as session:
+                wait_refill(session.pool)
+                self.assertLess(len(session.get_result("lost")), 100)
+                # not ended, not reused
+                self.assertEqual((session.stats.queries, session.stats.reused), (1, 0))
+                self.assertEqual(len(session.pool.idle), 0)
+                self.assertEqual(len(session.started), 0)
+
+    def test_pool_checks(self):
+        """Test idle connections timed out or closed by server are dropped"""
+        with lisptick_mock.MockServer(keep_alive=True) as server:
+            with lisptick.Session(server.host, server.port, size=1, reuse=True) as session:
+                wait_refill(session.pool)
+                for _ in range(3):
+                    self.assertEqual(session.get_result("""(+ 3 4)"""), 7)
+                    # connection lost while idle
+                    session.pool.idle[0][0].shutdown(socket.SHUT_RDWR)
+                self.assertEqual((session.stats.connects, session.stats.failed_checks), (3, 2))
+            with lisptick.ConnectionPool(server.host, server.port, size=2,
+                                         idle_timeout=0.05) as pool:
+                pool.refill()
+                wait_refill(pool)
+                self.assertEqual(len(pool.idle), 2)
+                time.sleep(0.1)
+                sock = pool.acquire()
+                sock.close()
+                self.assertEqual(pool.stats.failed_checks, 2)
+                # one opened for acquire, idle ones replaced
+                wait_refill(pool)
+                self.assertEqual(pool.stats.connects, 5)
+
+    def test_recv_only(self):
+        """Test result read from a connection only having recv"""
+        data = lisptick_mock.timeserie_stream(100, lisptick.TINT, heartbeat=10)
+        reader = lisptick.LisptickReader(RecvOnly(data))
+        self.assertEqual([point.i for point in reader.get_result()], list(range(100)))
+
+    def test_compact_timeserie(self):
+        """Test compact TimeSerie gives same points as list of Point"""
+        code = """[timeserie timeserie]"""
+        tseries = SERVER.client().get_result(code, compact=True)
+        self.assertTrue(isinstance(tseries[0], lisptick.TimeSerie))
+        # int and float values of a same timeserie are stored as float
+        self.assertEqual([[(point.time, point.i) for point in tserie] for tserie in tseries],
+                         [[(point.time, point.i) for point in tserie] for tserie in mock_get(code)])
+        self.assertEqual(str(tseries[1][2]), str(mock_get(code)[1][2]))
+
+    def test_limit(self):
+        """Test result is cut at limit points"""
+        code = """(timeserie 2017-10-26T09:19 48.6 2017-10-26T10:30 49 2017-10-26T11:51 49.27)"""
+        points = mock_get(code)
+        self.assertEqual(len(SERVER.client().get_result(code, limit=3)), 3)
+        with self.assertRaises(lisptick.LimitReached) as cm:
+            SERVER.client().get_result(code, limit=2)
+        self.assertEqual([str(point) for point in cm.exception.result],
+                         [str(point) for point in points[:2]])
+        tserie = SERVER.client().get_result(code, compact=True, limit=1, partial=True)
+        self.assertEqual(str(tserie[0]), str(points[0]))
+        self.assertEqual(len(tserie), 1)
+        self.assertEqual(len(list(SERVER.client().stream(code, limit=2))), 2)
+
+    def test_demux(self):
+        """Test timeseries of an array routed to their own queue"""
+        code = """[timeserie timeserie]"""
+        tseries = mock_get(code)
+        received = []
+        demux = lisptick.Demux(SERVER.client().stream(code))
+        demux.route(1, handler=lambda uid, point: received.append(str(point)))
+        latest = demux.route(2, policy=lisptick.CONFLATE)
+        with demux:
+            demux.join()
+        self.assertEqual(received, [str(point) for point in tseries[0]])
+        self.assertEqual([str(point) for _, point in latest][-1], str(tseries[1][-1]))
+
+    def test_route_unbounded(self):
+        """Test routes of maxsize 0 are unbounded whatever policy"""
+        for policy, size in [(lisptick.BLOCK, 5), (lisptick.DROP_OLDEST, 5),
+                             (lisptick.CONFLATE, 1)]:
+            route = lisptick.Route(1, maxsize=0, policy=policy)
+            for i in range(5):
+                route.put(1, i)
+            route.close()
+            self.assertEqual(len(list(route)), size)
+            self.assertEqual(route.dropped, 5 - size)
+
+    def test_as_of_join(self):
+        """Test timeseries of an array joined on last values"""
+        code = """[timeserie timeserie]"""
+        tseries = mock_get(code)
+        batches = []
+        join = lisptick.AsOfJoin(on_batch=lambda times, columns: batches.append(columns),
+                                 batch_size=4)
+        rows = list(join.join(SERVER.client().stream(code)))
+        join.flush()
+        self.assertEqual(len(rows), len(tseries[0]) + len(tseries[1]))
+        self.assertEqual(rows[0][1], [tseries[0][0].i, None])
+        self.assertEqual(rows[-1][1], [tseries[0][-1].i, tseries[1][-1].i])
+        self.assertEqual(sum(len(columns[0]) for columns in batches), len(rows))
+        with self.assertRaises(lisptick.LispTickException):
+            lisptick.AsOfJoin(fill="unknown")
+
+    def test_as_of_join_scalar(self):
+        """Test scalar values of an array are kept in every joined row"""
+        writer = lisptick_mock.StreamWriter().array(
+            0, [(lisptick.TTIMESERIE, 1), (lisptick.TINT, 2), (lisptick.TTIMESERIE, 3)])
+        writer.timeserie(1, "bid").value(42, 2).timeserie(3, "ask")
+        for i in range(4):
+            writer.point(1 + 2 * (i % 2), lisptick_mock.START + i * lisptick_mock.STEP, i)
+        data = writer.end().getvalue()
+        rows = lisptick.AsOfJoin().join(lisptick.Stream(data))
+        self.assertEqual([values for _, values in rows],
+                         [[0, 42, None], [0, 42, 1], [2, 42, 1], [2, 42, 3]])
+        join = lisptick.AsOfJoin(tolerance=datetime.timedelta(seconds=1),
+                                 fill=lisptick.FILL_DROP)
+        self.assertEqual([values for _, values in join.join(lisptick.Stream(data))],
+                         [[0, 42, 1], [2, 42, 1], [2, 42, 3]])
+
+    def test_resampler(self):
+        """Test OHLC bars of a streamed timeserie"""
+        second = 10**9
+        writer = lisptick_mock.StreamWriter().timeserie(0)
+        for time, value in [(0, 48.6), (second // 2, 49), (second, 49.27), (3 * second, 48)]:
+            writer.point(0, lisptick_mock.START + time, value)
+        stream = lisptick.Stream(writer.end().getvalue(), time_decoder=lisptick.TIME_NANO)
+        resampler = lisptick.Resampler(datetime.timedelta(seconds=1))
+        bars = [bar for _, bar in resampler.resample(stream)]
+        self.assertEqual([(bar.open, bar.high, bar.low, bar.close, bar.count) for bar in bars],
+                         [(48.6, 49, 48.6, 49, 2), (49.27, 49.27, 49.27, 49.27, 1),
+                          (48, 48, 48, 48, 1)])
+        self.assertEqual([bar.start for bar in bars],
+                         [lisptick_mock.START + time for time in [0, second, 3 * second]])
+
+    def test_downsampler(self):
+        """Test fixed size sample keeps extremes, first and last points"""
+        values = [(i * 7919) % 1000 for i in range(10000)]
+        writer = lisptick_mock.StreamWriter().timeserie(0)
+        for i, value in enumerate(values):
+            writer.point(0, lisptick_mock.START + i, value)
+        data = writer.end().getvalue()
+        for method in (lisptick.MINMAX, lisptick.LTTB):
+            downsampler = lisptick.Downsampler(100, method)
+            lisptick.LisptickReader(data).walk_result(downsampler.update)
+            points = downsampler.get_points()
+            self.assertTrue(len(points) <= 100)
+            self.assertEqual(points[0].i, values[0])
+            self.assertEqual(points[-1].i, values[-1])
+            if method == lisptick.MINMAX:
+                self.assertEqual(max(point.i for point in points), max(values))
+                self.assertEqual(min(point.i for point in points), min(values))
+
+    def test_pipeline(self):
+        """Test result received, decoded and consumed by separate threads"""
+        code = """[timeserie timeserie]"""
+        expected = [str(point) for tserie in mock_get(code) for point in tserie]
+        with SERVER.client().pipeline(code) as pipeline:
+            self.assertEqual([str(point) for _, point in pipeline], expected)
+            self.assertEqual(pipeline.get_stats().received, len(SERVER.response(code)[0]))
+        with self.assertRaises(lisptick.LispTickException):
+            list(SERVER.client().pipeline("""(+ "a" 3)"""))
+
+    def test_get_results(self):
+        """Test batched requests results in order, errors returned or raised"""
+        responses = {str(size): lisptick_mock.timeserie_stream(size, lisptick.TINT)
+                     for size in range(1000, 11000, 1000)}
+        requests = list(responses) + ["unknown"]
+        with lisptick_mock.MockServer(responses) as server:
+            client = server.client()
+            results = client.get_results(requests, max_parallel=4, budget=1,
+                                         on_error=lisptick.ON_ERROR_RETURN)
+            self.assertEqual([len(result) for result in results[:-1]],
+                             list(range(1000, 11000, 1000)))
+            self.assertTrue(isinstance(results[-1], lisptick.LispTickException))
+            done = [index for index, _ in client.iter_results(
+                requests[:-1], budget=65536, ordered=False)]
+            self.assertEqual(sorted(done), list(range(10)))
+            with self.assertRaises(lisptick.LispTickException):
+                client.get_results(requests)
+
+    def test_unhandled_type(self):
+        """Test unknown type byte ends result with an error"""
+        reader = lisptick.LisptickReader(b'\x10\x00\x00\x00')
+        self.assertEqual(reader.walk_result(lambda *_: None), "Unhandled type 16")
+
+    def test_time_decoder(self):
+        """Test nano second times decoded on demand"""
+        code = """(timeserie 2017-10-26T09:19 48.6 2017-10-26T10:30 49 2017-10-26T11:51 49.27)"""
+        points = mock_get(code)
+        client = lisptick.Socket(SERVER.host, SERVER.port,
+                                 time_decoder=lisptick.time_decoder(lisptick.TIME_NANO, 16))
+        nano_points = client.get_result(code)
+        self.assertTrue(isinstance(nano_points[0].time, lisptick.NanoTime))
+        self.assertEqual([point.time.get_datetime() for point in nano_points],
+                         [point.time for point in points])
+        utc_points = lisptick.Socket(SERVER.host, SERVER.port,
+                                     time_decoder=lisptick.TIME_UTC).get_result(code)
+        self.assertEqual([point.time for point in utc_points],
+                         [point.time.get_utc() for point in nano_points])
+
+    def test_record_replay(self):
+        """Test recorded result is replayed from file"""
+        path = os.path.join(tempfile.mkdtemp(), "record.bin")
+        SERVER.client().record("""[timeserie timeserie]""", path)
+        replay = lisptick.Replay(path)
+        self.assertEqual([[str(point) for point in tserie] for tserie in replay.get_result()],
+                         [[str(point) for point in tserie]
+                          for tserie in mock_get("""[timeserie timeserie]""")])
+        with replay.stream() as stream:
+            self.assertEqual(len(list(stream)), 6)
+        os.remove(path)
+
+    @unittest.skipIf(lisptick.numpy is None, "numpy is not installed")
+    def test_spill(self):
+        """Test timeseries spilled to chunk files and sliced by time"""
+        numpy = lisptick.numpy
+        directory = tempfile.mkdtemp()
+        with lisptick_mock.MockServer({"ts": lisptick_mock.timeserie_stream(
+                10000, lisptick.TINT, heartbeat=100)}) as server:
+            spilled = server.client().spill("ts", directory, chunk_points=1000)
+        times, values = lisptick.SpilledResult(directory).get_columns()
+        self.assertEqual(len(spilled), 10000)
+        self.assertEqual(len(spilled.get_chunks()), 10)
+        self.assertTrue(isinstance(spilled.get_chunks()[0][1], numpy.memmap))
+        self.assertEqual(values.tolist(), list(range(10000)))
+        start = times[2500]
+        stop = numpy.datetime64(int(times[7300].astype('int64')), 'ns')
+        part = spilled.get_columns(start=start, stop=stop)
+        self.assertEqual(part[1].tolist(), list(range(2500, 7300)))
+        self.assertTrue(isinstance(spilled.get_columns(start=start, stop=times[2600])[1],
+                                   numpy.memmap))
+        SERVER.client().spill("""[timeserie timeserie]""", directory)
+        spilled = lisptick.SpilledResult(directory)
+        self.assertEqual(spilled.keys(), [1, 2])
+        self.assertEqual(spilled.get_columns(2)[1].tolist(), [48.6, 49, 49.27])
+        self.assertEqual(spilled.get_others(), {})
+
+    @unittest.skipIf(lisptick.numpy is None, "numpy is not installed")
+    def test_spill_objects(self):
+        """Test object values spilled without pickle, failed spills removed"""
+        numpy = lisptick.numpy
+        directory = tempfile.mkdtemp()
+        others = ["a", [1, "b"], (3.5, "c"), lisptick.Duration(0, 1, 2, 3000),
+                  local_time(2017, 10, 26, 9, 19)]
+        writer = lisptick_mock.StreamWriter().array(
+            0, [(lisptick.TTIMESERIE, 1)] + [(lisptick.TINT, 2 + i) for i in range(5)])
+        writer.timeserie(1, "names", [(lisptick_mock.START + i, "n%d" % i) for i in range(5)])
+        for i, value in enumerate(others):
+            writer.value(value, 2 + i)
+        spilled = lisptick.LisptickReader(writer.end().getvalue()).spill(directory, 2)
+        self.assertEqual(spilled.get_columns("names")[1].tolist(),
+                         ["n0", "n1", "n2", "n3", "n4"])
+        self.assertEqual({pos: str(value) for pos, value in spilled.get_others().items()},
+                         {1 + i: str(value) for i, value in enumerate(others)})
+        for name in os.listdir(directory):
+            if name.endswith(".npy"):
+                numpy.load(os.path.join(directory, name), allow_pickle=False)
+        shutil.rmtree(directory)
+        # error after some chunks were written
+        writer = lisptick_mock.StreamWriter().timeserie(
+            0, "names", [(lisptick_mock.START + i, "n%d" % i) for i in range(5)])
+        with self.assertRaises(lisptick.LispTickException):
+            lisptick.LisptickReader(writer.error("failed").getvalue()).spill(directory, 2)
+        self.assertEqual(os.listdir(directory), [])
+        os.rmdir(directory)
+
+    @unittest.skipIf(lisptick.pyarrow is None, "pyarrow is not installed")
+    def test_arrow(self):
+        """Test timeseries exported as Arrow table and walked as record batches"""
+        code = """[timeserie timeserie]"""
+        table = lisptick.to_arrow(SERVER.client().get_columns(code))
+        self.assertEqual(table.column_names, ["time", "1", "2"])
+        self.assertEqual(table.column("2").to_pylist(), [48.6, 49, 49.27])
+        data = lisptick_mock.timeserie_stream(1000, lisptick.TINT, heartbeat=100)
+        batches = []
+        lisptick.LisptickReader(data).walk_arrow(
+            lambda _, uid, batch: batches.append(batch), batch_size=300)
+        self.assertEqual([batch.num_rows for batch in batches], [300, 300, 300, 100])
+        self.assertEqual(lisptick.pyarrow.Table.from_batches(batches).column(
+            "value").to_pylist(), list(range(1000)))
+
+    @unittest.skipIf(lisptick.pandas is None, "pandas is not installed")
+    def test_pandas(self):
+        """Test timeseries exported as DataFrame, aligned on times"""
+        numpy = lisptick.numpy
+        first = (numpy.array([1, 2, 3], 'datetime64[ns]'), numpy.array([1, 2, 3]))
+        second = (numpy.array([2, 4], 'datetime64[ns]'), numpy.array([1.5, 2.5]))
+        frame = lisptick.to_pandas({"a": first, "b": second})
+        self.assertEqual(frame.index.asi8.tolist(), [1, 2, 3, 4])
+        self.assertEqual(frame["a"].fillna(0).tolist(), [1, 2, 3, 0])
+        self.assertEqual(frame["b"].fillna(0).tolist(), [0, 1.5, 0, 2.5])
+        frame = lisptick.to_pandas(SERVER.client().get_columns(
+            """(timeserie 2017-10-26T09:19 48.6 2017-10-26T10:30 49 2017-10-26T11:51 49.27)"""))
+        self.assertEqual(frame["value"].tolist(), [48.6, 49, 49.27])
+        self.assertEqual(str(frame.index[0]), "2017-10-26 09:19:00+00:00")
+
+    @unittest.skipIf(lisptick.pyarrow is None, "pyarrow is not installed")
+    @unittest.skipIf(lisptick.pandas is None, "pandas is not installed")
+    def test_export_shares_memory(self):
+        """Test Arrow and pandas exports share numeric arrays"""
+        numpy = lisptick.numpy
+        columns = {"a": (numpy.array([1, 2, 3], 'datetime64[ns]'), numpy.array([1.5, 2, 3])),
+                   "b": (numpy.array([1, 2, 3], 'datetime64[ns]'), numpy.array([4, 5, 6]))}
+        table = lisptick.to_arrow(columns)
+        frame = lisptick.to_pandas(columns)
+        for key, (_, values) in columns.items():
+            self.assertTrue(numpy.shares_memory(
+                table.column(key).chunk(0).to_numpy(zero_copy_only=True), values))
+            self.assertTrue(numpy.shares_memory(frame[key].to_numpy(), values))
+
+    def test_cache(self):
+        """Test cached result is not requested again, (now) is never cached"""
+        directory = tempfile.mkdtemp()
+        cache = lisptick.ResultCache(directory)
+        with lisptick_mock.MockServer() as server:
+            conn = lisptick.Socket(server.host, server.port, cache=cache)
+            for _ in range(2):
+                self.assertEqual(conn.get_result("""(+ 3 4)"""), 7)
+                conn.get_result("""(now)""")
+            self.assertEqual(conn.get_result(""" (+ 3  4) ; seven"""), 7)
+            self.assertEqual(server.requests, ["""(+ 3 4)""", """(now)""", """(now)"""])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+        # cache hits are measured, flagged as cached
+        ended = []
+        conn.hooks = lisptick.StatsHooks()
+        conn.hooks.on_first_byte = lambda stats: ended.append("first byte")
+        conn.hooks.on_end = ended.append
+        self.assertEqual(conn.get_result("""(+ 3 4)"""), 7)
+        self.assertEqual(list(conn.stream("""(+ 3 4)""")), [(0, 7)])
+        self.assertEqual([stats if stats == "first byte" else stats.cached
+                          for stats in ended], ["first byte", True] * 2)
+        self.assertEqual((ended[1].elements["int"], ended[1].received > 0), (1, True))
+        cache.clear()
+        os.rmdir(directory)
+
+    @unittest.skipIf(lisptick.numpy is None, "numpy is not installed")
+    def test_cache_limit(self):
+        """Test limited and stopped reads end early and are not cached"""
+        directory = tempfile.mkdtemp()
+        cache = lisptick.ResultCache(directory)
+        data = lisptick_mock.timeserie_stream(100000, lisptick.TINT)
+        with lisptick_mock.MockServer({"ts": data}) as server:
+            conn = lisptick.Socket(server.host, server.port, cache=cache)
+            conn.hooks = lisptick.StatsHooks()
+            received = []
+            conn.hooks.on_end = lambda stats: received.append(stats.received)
+            self.assertEqual(len(conn.get_result("ts", limit=10, partial=True)), 10)
+            conn.walk_result("ts", lambda reader, _, __: reader.stop())
+            self.assertEqual(os.listdir(directory), [])
+            self.assertTrue(all(size < len(data) for size in received))
+            self.assertEqual(len(conn.get_columns("ts")[0]), 100000)
+            self.assertEqual(len(conn.get_result("ts", limit=10, partial=True)), 10)
+            self.assertEqual(len(server.requests), 3)
+        self.assertEqual(cache.hits, 1)
+        cache.clear()
+        os.rmdir(directory)
+
+    def test_cache_eviction(self):
+        """Test least recently used results are evicted, never the one put"""
+        directory = tempfile.mkdtemp()
+        data = lisptick_mock.timeserie_stream(100, lisptick.TINT)
+        results = {name: data for name in ["a", "b", "c"]}
+        with lisptick_mock.MockServer(results) as server:
+            cache = lisptick.ResultCache(directory, max_size=2 * len(data))
+            conn = lisptick.Socket(server.host, server.port, cache=cache)
+            conn.get_result("a")
+            conn.get_result("b")
+            # a used last, b evicted when c is put
+            past = time.time() - 10
+            os.utime(cache.get(server.host, server.port, "b"), (past, past))
+            conn.get_result("a")
+            conn.get_result("c")
+            self.assertIsNone(cache.get(server.host, server.port, "b"))
+            for name in ["a", "c"]:
+                self.assertEqual(len(conn.get_result(name)), 100)
+            self.assertEqual(server.requests, ["a", "b", "c"])
+            # a result above max_size is still cached, others are evicted
+            cache.max_size = 10
+            self.assertEqual(len(conn.get_result("b")), 100)
+            self.assertEqual(len(os.listdir(directory)), 1)
+            self.assertEqual(len(conn.get_result("b")), 100)
+            self.assertEqual(server.requests, ["a", "b", "c", "b"])
+        cache.clear()
+        os.rmdir(directory)
+
+    def test_cache_ttl(self):
+        """Test results older than ttl are requested again"""
+        directory = tempfile.mkdtemp()
+        cache = lisptick.ResultCache(directory, ttl=60)
+        with lisptick_mock.MockServer() as server:
+            conn = lisptick.Socket(server.host, server.port, cache=cache)
+            self.assertEqual(conn.get_result("""(+ 3 4)"""), 7)
+            self.assertEqual(conn.get_result("""(+ 3 4)"""), 7)
+            past = time.time() - 120
+            os.utime(cache.get(server.host, server.port, """(+ 3 4)"""), (past, past))
+            self.assertEqual(conn.get_result("""(+ 3 4)"""), 7)
+            self.assertEqual(server.requests, ["""(+ 3 4)""", """(+ 3 4)"""])
+        cache.clear()
+        os.rmdir(directory)
+
+    def test_sharded_times(self):
+        """Test sharded list results with nano second and UTC times"""
+        start = datetime.datetime.fromtimestamp(lisptick_mock.START // 1000000000)
+        stop = start + datetime.timedelta(seconds=100)
+        with lisptick_mock.MockServer() as server:
+            server.response = lambda code: window_stream(code, 200)
+            for time_decoder in [lisptick.TIME_NANO, lisptick.TIME_UTC]:
+                conn = lisptick.Socket(server.host, server.port, time_decoder=time_decoder)
+                res = conn.get_sharded("ts {start} {stop}", start, stop, shards=4)
+                self.assertEqual([point.i for point in res], list(range(101)))
+
+    def test_shard_bounds(self):
+        """Test shard bounds cover start to stop in whole seconds"""
+        start = datetime.datetime.fromtimestamp(lisptick_mock.START // 1000000000)
+        first = lisptick_mock.START // 1000000000
+        self.assertEqual(lisptick.shard_bounds(
+            start, start + datetime.timedelta(seconds=100), 3),
+                         [first, first + 33, first + 66, first + 100])
+        # no window shorter than a second
+        self.assertEqual(lisptick.shard_bounds(
+            start, start + datetime.timedelta(seconds=2), 8), [first, first + 1, first + 2])
+        self.assertEqual(lisptick.shard_bounds(start, start, 8), [first, first])
+
+    def test_sharded(self):
+        """Test sharded windows are merged in order, bounds points once"""
+        start = datetime.datetime.fromtimestamp(lisptick_mock.START // 1000000000)
+        stop = start + datetime.timedelta(seconds=100)
+
+        def response(code):
+            # first windows answer last
+            delay = 100 - (window_bounds(code)[0] - lisptick_mock.START // 1000000000)
+            time.sleep(delay / 5000)
+            return window_stream(code, 200)
+
+        with lisptick_mock.MockServer() as server:
+            server.response = response
+            conn = server.client()
+            # every window starts and stops on a point, last one included
+            res = conn.get_sharded("ts {start} {stop}", start, stop, shards=10, parallel=3)
+            self.assertEqual([point.i for point in res], list(range(101)))
+            self.assertEqual(len(server.requests), 10)
+            parts = list(conn.iter_sharded("ts {start} {stop}", start, stop,
+                                           shards=4, parallel=2))
+            self.assertEqual([[point.i for point in part] for part in parts],
+                             [list(range(0, 25)), list(range(25, 50)),
+                              list(range(50, 75)), list(range(75, 101))])
+            if lisptick.numpy is not None:
+                times, values = conn.get_sharded("ts {start} {stop}", start, stop,
+                                                 shards=7, parallel=2, columns=True)
+                self.assertEqual(values.tolist(), list(range(101)))
+                self.assertTrue((times.view('int64')[1:] > times.view('int64')[:-1]).all())
+                self.assertEqual([len(part[1]) for part in conn.iter_sharded(
+                    "ts {start} {stop}", start, stop, shards=4, parallel=3, columns=True)],
+                                 [25, 25, 25, 26])
+
+    def test_sharded_error(self):
+        """Test a failed window raises and cancels windows not yet requested"""
+        start = datetime.datetime.fromtimestamp(lisptick_mock.START // 1000000000)
+        stop = start + datetime.timedelta(seconds=100)
+        second = lisptick_mock.START // 1000000000 + 10
+
+        def response(code):
+            if window_bounds(code)[0] == second:
+                return [lisptick_mock.StreamWriter().error("window failed").getvalue()]
+            return window_stream(code, 200)
+
+        with lisptick_mock.MockServer() as server:
+            server.response = response
+            conn = server.client()
+            for columns in [False, True] if lisptick.numpy is not None else [False]:
+                del server.requests[:]
+                with self.assertRaises(lisptick.LispTickException):
+                    conn.get_sharded("ts {start} {stop}", start, stop, shards=10,
+                                     parallel=2, columns=columns)
+                self.assertLess(len(server.requests), 10)
+
+
+def local_time(*args):
+    """Local naive datetime of an UTC time, as decoded by LisptickReader"""
+    utc = datetime.datetime(*args, tzinfo=datetime.timezone.utc)
+    return datetime.datetime.fromtimestamp(utc.timestamp())
+
+
+def mock_get(code):
+    """Call mock server and get raw result"""
+    return SERVER.client().get_result(code)
+
+
+class RecvOnly():
+    """Connection only having recv, sending data 5 bytes at a time"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def recv(self, size):
+        """Next bytes of data, at most 5"""
+        res = self.data[:min(size, 5)]
+        self.data = self.data[len(res):]
+        return res
+
+
+def closed_port():
+    """Local port nothing listens to"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def wait_refill(pool):
+    """Wait for pool background refill"""
+    while pool.refilling:
+        time.sleep(0.01)
+
+
+def window_stream(code, points):
+    """Chunks of points i at START + i * STEP in "ts {start} {stop}" window,
+    stop included like a server may do"""
+    first, last = [bound * 1000000000 for bound in window_bounds(code)]
+    times = [lisptick_mock.START + i * lisptick_mock.STEP for i in range(points)]
+    return [lisptick_mock.StreamWriter().timeserie(0, "ts", [
+        (time, i) for i, time in enumerate(times) if first <= time <= last]).end().getvalue()]
+
+
+def window_bounds(code):
+    """Epoch seconds of "ts {start} {stop}" window bounds"""
+    return [int(datetime.datetime.strptime(bound, "%Y-%m-%dT%H:%M:%S").replace(
+        tzinfo=datetime.timezone.utc).timestamp()) for bound in code.split()[1:]]
+
+
+if __name__ == "__main__":
+    unittest.main()